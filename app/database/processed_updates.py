@@ -4,11 +4,175 @@ Update deduplication for multi-instance deployment.
 Ensures each Telegram update is processed only once even when multiple
 bot instances are running simultaneously (e.g., during Render rolling deployment).
 """
+import asyncio
 import logging
-from typing import Optional
+import time
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+try:
+    import asyncpg  # type: ignore
+    _DB_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+except ImportError:  # pragma: no cover
+    asyncpg = None
+    _DB_ERRORS = (OSError, asyncio.TimeoutError)
 
 logger = logging.getLogger(__name__)
 
+# In-process front cache of recently seen update_ids (update_id -> monotonic ts).
+# Postgres stays the cross-instance source of truth; this only absorbs repeats
+# that already hit this worker.
+_SEEN_MAX = 50_000
+_SEEN_TTL = 600.0
+_seen: "OrderedDict[int, float]" = OrderedDict()
+
+
+def _seen_recently(update_id: int) -> bool:
+    """Return True if update_id is in the local cache and not expired."""
+    ts = _seen.get(update_id)
+    if ts is None:
+        return False
+    if time.monotonic() - ts > _SEEN_TTL:
+        _seen.pop(update_id, None)
+        return False
+    return True
+
+
+def _remember(update_id: int) -> None:
+    """Record update_id in the local cache, evicting oldest/expired entries."""
+    now = time.monotonic()
+    _seen[update_id] = now
+    _seen.move_to_end(update_id)
+    # Entries are in insertion order, so expired ones sit at the left
+    while _seen:
+        _, oldest_ts = next(iter(_seen.items()))
+        if len(_seen) > _SEEN_MAX or now - oldest_ts > _SEEN_TTL:
+            _seen.popitem(last=False)
+        else:
+            break
+
+
+# Micro-batching of dedup inserts: updates arriving within _BATCH_WINDOW seconds
+# (up to _BATCH_MAX of them) share a single INSERT round-trip.
+_BATCH_MAX = 200
+_BATCH_WINDOW = 0.02
+
+_BATCH_INSERT_SQL = """
+    INSERT INTO processed_updates (update_id, processed_at)
+    SELECT unnest($1::bigint[]), NOW()
+    ON CONFLICT (update_id) DO NOTHING
+    RETURNING update_id
+"""
+
+
+class _UpdateBatcher:
+    """Queue-backed worker that flushes pending update_ids in one statement."""
+    
+    def __init__(self, db_service):
+        # Weak: this batcher is the value for db_service in _batchers, and a
+        # strong reference back to its own key would keep the entry alive forever.
+        # Once the service is collected the worker has nothing to flush to: stop it.
+        self._db_service = weakref.ref(db_service, lambda _ref: self.stop())
+        self.loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Tuple[int, asyncio.Future]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+    
+    def submit(self, update_id: int) -> asyncio.Future:
+        """Enqueue update_id; the future resolves to True if it was newly inserted."""
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        future = self.loop.create_future()
+        self._queue.put_nowait((update_id, future))
+        return future
+    
+    def stop(self) -> None:
+        """Cancel the worker and fail queued submissions (their callers fail open)."""
+        if self._task is not None and not self._task.done() and not self.loop.is_closed():
+            self._task.cancel()
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        _fail_pending(pending, ConnectionError("update batcher stopped"))
+    
+    async def aclose(self) -> None:
+        """stop() and wait for the worker to finish (if it runs on this loop)."""
+        task = self._task
+        self.stop()
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            await asyncio.wait([task])
+    
+    async def _run(self) -> None:
+        batch: List[Tuple[int, asyncio.Future]] = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = self.loop.time() + _BATCH_WINDOW
+                while len(batch) < _BATCH_MAX:
+                    timeout = deadline - self.loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush(batch)
+        finally:
+            # Cancelled while collecting a batch: nobody else will resolve it
+            _fail_pending(batch, ConnectionError("update batcher stopped"))
+    
+    async def _flush(self, batch: List[Tuple[int, asyncio.Future]]) -> None:
+        update_ids = list(dict.fromkeys(update_id for update_id, _ in batch))
+        try:
+            db_service = self._db_service()
+            if db_service is None:
+                raise ConnectionError("database service was closed")
+            # Before initialize() / after close() fetch() would hit a None pool
+            # (AttributeError); report it as a connection error so callers fail open
+            if getattr(db_service, "pool", True) is None:
+                raise ConnectionError("database pool is not available")
+            rows = await db_service.fetch(_BATCH_INSERT_SQL, update_ids)
+        except Exception as e:
+            _fail_pending(batch, e)
+            return
+        except BaseException:
+            # Cancelled mid-query: fail the waiters before propagating
+            _fail_pending(batch, ConnectionError("update batcher stopped"))
+            raise
+        
+        inserted = {row["update_id"] for row in rows}
+        for update_id, future in batch:
+            if future.done():
+                continue
+            # Same update_id twice in one batch: only the first caller wins
+            future.set_result(update_id in inserted)
+            inserted.discard(update_id)
+
+
+def _fail_pending(batch: List[Tuple[int, asyncio.Future]], error: BaseException) -> None:
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
+
+_batchers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _get_batcher(db_service) -> _UpdateBatcher:
+    """Return the batcher bound to db_service on the running event loop."""
+    batcher = _batchers.get(db_service)
+    if batcher is None or batcher.loop is not asyncio.get_running_loop():
+        batcher = _UpdateBatcher(db_service)
+        _batchers[db_service] = batcher
+    return batcher
+
+
+async def close_update_batcher(db_service) -> None:
+    """Stop db_service's dedupe batcher (called from DatabaseService.close())."""
+    batcher = _batchers.pop(db_service, None)
+    if batcher is not None:
+        await batcher.aclose()
+
 
 async def mark_update_processed(db_service, update_id: int) -> bool:
     """
@@ -22,28 +186,25 @@ async def mark_update_processed(db_service, update_id: int) -> bool:
         True if this is first time processing this update
         False if update already processed (duplicate)
     """
+    if _seen_recently(update_id):
+        logger.debug("⏭️ Update %s already seen by this instance (duplicate)", update_id)
+        return False
+    
     try:
-        # Use RETURNING to detect if insert happened or was skipped
-        result = await db_service.fetchrow("""
-            INSERT INTO processed_updates (update_id, processed_at)
-            VALUES ($1, NOW())
-            ON CONFLICT (update_id) DO NOTHING
-            RETURNING update_id
-        """, update_id)
-        
-        # If RETURNING gave us a row, insert succeeded (first time)
-        # If no row, conflict occurred (duplicate)
-        if result:
-            logger.debug(f"✅ Update {update_id} marked as NEW (first time)")
-            return True
-        else:
-            logger.debug(f"⏭️ Update {update_id} already exists (duplicate)")
-            return False
-            
-    except Exception as e:
+        # Batched insert: RETURNING reports which update_ids were actually new
+        is_new = await _get_batcher(db_service).submit(update_id)
+    except _DB_ERRORS as e:
         # DB error - log and assume NOT duplicate to avoid dropping updates
-        logger.error(f"❌ Error marking update {update_id}: {e}")
+        logger.error("❌ Error marking update %s: %s", update_id, e)
         return True
+    
+    _remember(update_id)
+    if is_new:
+        logger.debug("✅ Update %s marked as NEW (first time)", update_id)
+        return True
+    
+    logger.debug("⏭️ Update %s already exists (duplicate)", update_id)
+    return False
 
 
 async def is_update_processed(db_service, update_id: int) -> bool:
@@ -57,22 +218,54 @@ async def is_update_processed(db_service, update_id: int) -> bool:
     Returns:
         True if already processed, False otherwise
     """
+    if _seen_recently(update_id):
+        return True
+    
     try:
         result = await db_service.fetchrow(
             "SELECT update_id FROM processed_updates WHERE update_id = $1",
             update_id
         )
-        return result is not None
+        if result is not None:
+            _remember(update_id)
+            return True
+        return False
     except Exception as e:
-        logger.error(f"Error checking processed update {update_id}: {e}")
+        logger.error("Error checking processed update %s: %s", update_id, e)
         # On error, assume not processed to avoid dropping updates
         return False
 
 
+# Rows removed per DELETE statement in cleanup_old_updates; keeps locks short.
+# The hot dedup INSERT above and this DELETE are constant SQL texts, so
+# asyncpg's per-connection statement cache prepares each once; the daily
+# cleanup only costs one cache slot, which is cheaper than a dedicated connection.
+_CLEANUP_CHUNK = 10_000
+
+_CLEANUP_SQL = """
+    DELETE FROM processed_updates
+    WHERE ctid IN (
+        SELECT ctid FROM processed_updates
+        WHERE processed_at < NOW() - ($1::int * INTERVAL '1 day')
+        LIMIT $2
+    )
+"""
+
+
+def _parse_delete_count(result) -> int:
+    """Extract row count from asyncpg status string (e.g., "DELETE 123")."""
+    if isinstance(result, str) and result.startswith("DELETE "):
+        return int(result.split()[1])
+    return 0
+
+
 async def cleanup_old_updates(db_service, days: int = 7) -> int:
     """
     Clean up processed updates older than specified days.
     
+    Deletes in chunks of _CLEANUP_CHUNK rows using an index range scan on
+    processed_at, so large backlogs never hold a long table lock.
+    
     Args:
         db_service: DatabaseService instance
         days: Number of days to keep (default 7)
@@ -80,21 +273,19 @@ async def cleanup_old_updates(db_service, days: int = 7) -> int:
     Returns:
         Number of rows deleted
     """
+    deleted = 0
     try:
-        result = await db_service.execute(f"""
-            DELETE FROM processed_updates
-            WHERE processed_at < NOW() - INTERVAL '{days} days'
-        """)
-        
-        # Extract row count from result string (e.g., "DELETE 123")
-        deleted = 0
-        if isinstance(result, str) and result.startswith("DELETE "):
-            deleted = int(result.split()[1])
-        
-        if deleted > 0:
-            logger.info(f"Cleaned up {deleted} processed updates older than {days} days")
-        
-        return deleted
+        while True:
+            result = await db_service.execute(_CLEANUP_SQL, int(days), _CLEANUP_CHUNK)
+            chunk = _parse_delete_count(result)
+            deleted += chunk
+            if chunk < _CLEANUP_CHUNK:
+                break
     except Exception as e:
-        logger.error(f"Error cleaning up old updates: {e}")
-        return 0
+        logger.error("Error cleaning up old updates: %s", e)
+        return deleted
+    
+    if deleted > 0:
+        logger.info("Cleaned up %s processed updates older than %s days", deleted, days)
+    
+    return deleted
@@ -173,12 +173,20 @@ CREATE INDEX IF NOT EXISTS idx_gen_events_status ON generation_events(status, cr
 CREATE INDEX IF NOT EXISTS idx_gen_events_request ON generation_events(request_id);
 
 -- Processed Telegram updates (for multi-instance idempotency)
+-- Not range-partitioned by processed_at: a partitioned PK must include the
+-- partition key, which would break ON CONFLICT (update_id) dedup.
 CREATE TABLE IF NOT EXISTS processed_updates (
     update_id BIGINT PRIMARY KEY,
     processed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_processed_updates_timestamp ON processed_updates(processed_at);
+
+-- High-churn table: vacuum early so chunked cleanup deletes don't leave bloat
+ALTER TABLE processed_updates SET (
+    autovacuum_vacuum_scale_factor = 0.02,
+    autovacuum_analyze_scale_factor = 0.01
+);
 """
 
 
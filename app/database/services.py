@@ -9,6 +9,7 @@ Production-safe with:
 """
 import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 from decimal import Decimal
 from typing import Optional, List, Dict, Any
@@ -23,9 +24,20 @@ except ImportError:  # pragma: no cover
     HAS_ASYNCPG = False
 
 from app.database.schema import apply_schema, verify_schema
+from app.database.processed_updates import close_update_batcher
+from app.database.users import clear_ensured_users_cache
 
 logger = logging.getLogger(__name__)
 
+# Shared pool settings (one pool per DatabaseService, reused by all callers).
+# asyncpg keeps an LRU of prepared statements per connection, so hot queries
+# (dedup INSERT, user upsert, balance reads) are parsed once per connection.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "1024"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+
 
 async def ensure_user_exists(
     db_service,
@@ -55,21 +67,39 @@ async def ensure_user_exists(
 class DatabaseService:
     """Main database service with connection pooling."""
     
-    def __init__(self, dsn: str):
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime: float = DB_POOL_MAX_INACTIVE_LIFETIME,
+        statement_cache_size: int = DB_STATEMENT_CACHE_SIZE,
+        command_timeout: float = DB_COMMAND_TIMEOUT,
+    ):
         self.dsn = dsn
         self._pool: Optional[asyncpg.Pool] = None
+        self._pool_kwargs = {
+            "min_size": min_size,
+            "max_size": max_size,
+            "max_inactive_connection_lifetime": max_inactive_connection_lifetime,
+            "statement_cache_size": statement_cache_size,
+            "command_timeout": command_timeout,
+        }
+    
+    @property
+    def pool(self) -> Optional["asyncpg.Pool"]:
+        """Shared connection pool (None until initialize())."""
+        return self._pool
     
     async def initialize(self):
         """Initialize connection pool and apply schema."""
         if not HAS_ASYNCPG:
             raise ImportError("asyncpg is required for database operations")
         
-        self._pool = await asyncpg.create_pool(
-            self.dsn,
-            min_size=2,
-            max_size=10,
-            command_timeout=60
-        )
+        if self._pool is not None:
+            return
+        
+        self._pool = await asyncpg.create_pool(self.dsn, **self._pool_kwargs)
         
         # Apply schema
         async with self._pool.acquire() as conn:
@@ -82,9 +112,14 @@ class DatabaseService:
     
     async def close(self):
         """Close connection pool."""
+        # Stop the dedupe batcher first so no flush runs against a closing pool
+        await close_update_batcher(self)
         if self._pool:
             await self._pool.close()
+            self._pool = None
             logger.info("Database pool closed")
+        # A re-initialized service may point at a reset DB: upsert users again
+        clear_ensured_users_cache(db_service=self)
     
     @asynccontextmanager
     async def transaction(self):
@@ -214,6 +249,45 @@ class UserService:
             )
             return dict(meta or {})
 
+    async def consume_metadata_counter(self, user_id: int, key: str) -> Optional[int]:
+        """Atomically decrement a positive integer metadata counter.
+
+        Returns the remaining value, or None if the counter was missing/zero.
+        """
+        return await self.db.fetchval(
+            """
+            UPDATE users
+            SET metadata = jsonb_set(
+                COALESCE(metadata, '{}'::jsonb), ARRAY[$2::text],
+                to_jsonb((metadata->>$2::text)::int - 1)
+            )
+            WHERE user_id = $1 AND COALESCE((metadata->>$2::text)::int, 0) > 0
+            RETURNING (metadata->>$2::text)::int
+            """,
+            user_id,
+            key,
+        )
+
+    async def increment_metadata_counter(
+        self, user_id: int, key: str, delta: int, min_value: int = 0
+    ) -> Optional[int]:
+        """Atomically add delta to an integer metadata counter (clamped at min_value)."""
+        return await self.db.fetchval(
+            """
+            UPDATE users
+            SET metadata = jsonb_set(
+                COALESCE(metadata, '{}'::jsonb), ARRAY[$2::text],
+                to_jsonb(GREATEST(COALESCE((metadata->>$2::text)::int, 0) + $3::int, $4::int))
+            )
+            WHERE user_id = $1
+            RETURNING (metadata->>$2::text)::int
+            """,
+            user_id,
+            key,
+            delta,
+            min_value,
+        )
+
 
 class WalletService:
     """Wallet and balance operations."""
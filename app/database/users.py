@@ -1,9 +1,57 @@
 """User database operations - safe upserts to prevent FK violations."""
 import logging
-from typing import Optional
+import time
+import weakref
+from typing import Any, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Recently ensured users per DB service: service -> {user_id: ((username, first, last), expires_at)}.
+# Repeated messages from the same user within the TTL skip the DB entirely.
+# Keyed on the service object itself (weakly), so a new service never inherits
+# another's entries; DatabaseService.close() clears its own.
+ENSURE_USER_TTL_SECONDS = 300
+_ENSURE_USER_CACHE_MAX = 50_000
+_recently_ensured: "weakref.WeakKeyDictionary[Any, Dict[int, Tuple[tuple, float]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _ensured_for(db_service, create: bool = False) -> Optional[Dict[int, Tuple[tuple, float]]]:
+    """Per-service cache dict (None if absent, or the service is not weak-referenceable)."""
+    try:
+        if create:
+            return _recently_ensured.setdefault(db_service, {})
+        return _recently_ensured.get(db_service)
+    except TypeError:
+        return None
+
+
+def _remember_ensured(db_service, user_id: int, fields: tuple) -> None:
+    ensured = _ensured_for(db_service, create=True)
+    if ensured is None:
+        return
+    now = time.monotonic()
+    if len(ensured) >= _ENSURE_USER_CACHE_MAX:
+        for uid in [uid for uid, entry in ensured.items() if entry[1] <= now]:
+            del ensured[uid]
+        if len(ensured) >= _ENSURE_USER_CACHE_MAX:
+            ensured.clear()
+    ensured[user_id] = (fields, now + ENSURE_USER_TTL_SECONDS)
+
+
+def clear_ensured_users_cache(user_id: Optional[int] = None, db_service=None) -> None:
+    """Forget cached ensure_user_exists results (all, one service's, or a single user's)."""
+    if db_service is not None:
+        caches = [_ensured_for(db_service) or {}]
+    else:
+        caches = list(_recently_ensured.values())
+    for ensured in caches:
+        if user_id is not None:
+            ensured.pop(user_id, None)
+        else:
+            ensured.clear()
+
 
 async def ensure_user_exists(
     db_service,
@@ -17,7 +65,10 @@ async def ensure_user_exists(
     
     Uses INSERT ... ON CONFLICT DO UPDATE to atomically:
     - Create user if missing
-    - Update username/first_name/last_name if changed
+    - Update username/first_name/last_name if changed (no row write otherwise)
+    
+    Calls repeated within ENSURE_USER_TTL_SECONDS with the same fields are
+    answered from an in-process cache without touching the DB.
     
     This prevents FK violations when logging events or payments.
     Safe to call multiple times (idempotent).
@@ -33,7 +84,13 @@ async def ensure_user_exists(
         Never raises - logs warnings on failure
     """
     if not db_service:
-        logger.warning(f"ensure_user_exists: no db_service for user {user_id}")
+        logger.warning("ensure_user_exists: no db_service for user %s", user_id)
+        return
+    
+    fields = (username, first_name, last_name)
+    ensured = _ensured_for(db_service)
+    cached = ensured.get(user_id) if ensured is not None else None
+    if cached is not None and cached[0] == fields and cached[1] > time.monotonic():
         return
     
     try:
@@ -48,13 +105,17 @@ async def ensure_user_exists(
                 tg_first_name = COALESCE(EXCLUDED.tg_first_name, users.tg_first_name),
                 tg_last_name = COALESCE(EXCLUDED.tg_last_name, users.tg_last_name),
                 updated_at = NOW()
+            WHERE users.tg_username IS DISTINCT FROM COALESCE(EXCLUDED.tg_username, users.tg_username)
+               OR users.tg_first_name IS DISTINCT FROM COALESCE(EXCLUDED.tg_first_name, users.tg_first_name)
+               OR users.tg_last_name IS DISTINCT FROM COALESCE(EXCLUDED.tg_last_name, users.tg_last_name)
             """,
             user_id,
             username,
             first_name,
             last_name,
         )
-        logger.debug(f"User {user_id} ensured in DB (new schema)")
+        _remember_ensured(db_service, user_id, fields)
+        logger.debug("User %s ensured in DB (new schema)", user_id)
         
     except Exception as e:
         # Fallback for old schema (username, first_name without tg_ prefix)
@@ -67,12 +128,15 @@ async def ensure_user_exists(
                 DO UPDATE SET
                     username = COALESCE(EXCLUDED.username, users.username),
                     first_name = COALESCE(EXCLUDED.first_name, users.first_name)
+                WHERE users.username IS DISTINCT FROM COALESCE(EXCLUDED.username, users.username)
+                   OR users.first_name IS DISTINCT FROM COALESCE(EXCLUDED.first_name, users.first_name)
                 """,
                 user_id,
                 username,
                 first_name,
             )
-            logger.debug(f"User {user_id} ensured in DB (old schema fallback)")
+            _remember_ensured(db_service, user_id, fields)
+            logger.debug("User %s ensured in DB (old schema fallback)", user_id)
         except Exception as e2:
             # Non-critical: log warning but don't crash
-            logger.warning(f"Failed to ensure user {user_id}: {e} / fallback: {e2}")
+            logger.warning("Failed to ensure user %s: %s / fallback: %s", user_id, e, e2)
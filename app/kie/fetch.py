@@ -5,11 +5,17 @@ By default DISABLED to avoid unnecessary API calls and errors in production.
 Enable via: MODEL_SYNC_ENABLED=1
 """
 
+import asyncio
 import json
 import logging
 import os
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +43,14 @@ async def fetch_models_list() -> List[Dict]:
     return await _load_local_models()
 
 
+def _read_json(path: Path) -> Any:
+    """Parse JSON file, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
 async def _load_local_models() -> List[Dict]:
     """
     Load models from local kie_models_final_truth.json.
@@ -56,8 +70,8 @@ async def _load_local_models() -> List[Dict]:
         return []
     
     try:
-        with open(truth_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        # Parse off the event loop: the truth file is several MB
+        data = await asyncio.to_thread(_read_json, truth_path)
         
         # Normalize to list
         models_list = []
@@ -3,11 +3,12 @@ Integration of payments with generation flow.
 Ensures charges are only committed on success.
 Handles FREE tier models (no charge).
 """
+import asyncio
 import logging
+import secrets
 from app.utils.trace import TraceContext, get_request_id
 import time
-from typing import Dict, Any, Optional
-from uuid import uuid4
+from typing import Any, Awaitable, Dict, Optional
 
 from app.payments.charges import ChargeManager, get_charge_manager
 from app.kie.generator import KieGenerator
@@ -20,6 +21,47 @@ from app.database.generation_events import log_generation_event
 logger = logging.getLogger(__name__)
 
 
+def _attach_payment_info(
+    gen_result: Dict[str, Any],
+    charge_task_id: Optional[str],
+    payment_status: str,
+    payment_message: str,
+) -> Dict[str, Any]:
+    """Add payment fields to the generator result in place (it is ours to mutate)."""
+    gen_result['charge_task_id'] = charge_task_id
+    gen_result['payment_status'] = payment_status
+    gen_result['payment_message'] = payment_message
+    return gen_result
+
+
+async def _settle_with_metrics(
+    settle: Awaitable[Dict[str, Any]],
+    metrics: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Await a charge commit/release alongside track_generation(**metrics).
+
+    Both are started inside one gather, so neither can be left un-awaited, and a
+    metrics failure is only logged: the charge result is returned regardless.
+    """
+    track_result, settle_result = await asyncio.gather(
+        track_generation(**metrics), settle, return_exceptions=True
+    )
+    if isinstance(track_result, BaseException):
+        logger.warning("Generation metrics tracking failed: %s", track_result)
+    if isinstance(settle_result, BaseException):
+        raise settle_result
+    return settle_result
+
+
+async def _restore_referral_use(user_service: Optional[UserService], user_id: int) -> None:
+    """Give back a consumed referral-free use (never raises)."""
+    try:
+        if user_service is not None:
+            await user_service.increment_metadata_counter(user_id, "referral_free_uses", +1)
+    except Exception as e:
+        logger.warning("Failed to restore referral-free use after failure: %s", e)
+
+
 async def generate_with_payment(
     model_id: str,
     user_inputs: Optional[Dict[str, Any]] = None,
@@ -60,13 +102,15 @@ async def generate_with_payment(
     if user_inputs is not None and payload is not None:
         # Both provided - log warning and prioritize user_inputs
         logger.warning(
-            f"⚠️ Both user_inputs and payload provided - using user_inputs "
-            f"(user_inputs keys: {list(user_inputs.keys()) if user_inputs else []}, "
-            f"payload keys: {list(payload.keys()) if payload else []})"
+            "⚠️ Both user_inputs and payload provided - using user_inputs "
+            "(user_inputs keys: %s, payload keys: %s)",
+            list(user_inputs.keys()) if user_inputs else [],
+            list(payload.keys()) if payload else [],
         )
     
     if user_inputs is None and payload is not None:
-        logger.debug(f"🔄 Backward compat: payload->user_inputs (keys: {list(payload.keys()) if payload else []})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔄 Backward compat: payload->user_inputs (keys: %s)", list(payload.keys()) if payload else [])
         user_inputs = payload
     elif user_inputs is None:
         user_inputs = {}
@@ -79,20 +123,25 @@ async def generate_with_payment(
     known_kwargs = {'user_id'}
     unknown = set(kwargs.keys()) - known_kwargs
     if unknown:
-        logger.debug(f"🔧 Ignored unknown kwargs: {unknown}")
+        logger.debug("🔧 Ignored unknown kwargs: %s", unknown)
     
     # Request-scoped trace (correlation id for logs)
-    with TraceContext(user_id=user_id, model_id=model_id, request_id=(get_request_id() if get_request_id() != '-' else None)) as _trace:
-        logger.info(f"▶️ generate_with_payment start amount={amount} reserve_balance={reserve_balance} timeout={timeout}s")
+    parent_request_id = get_request_id()
+    with TraceContext(user_id=user_id, model_id=model_id, request_id=(parent_request_id if parent_request_id != '-' else None)) as _trace:
+        logger.info(
+            "▶️ generate_with_payment start amount=%s reserve_balance=%s timeout=%ss",
+            amount, reserve_balance, timeout,
+        )
         
         # Resolve db_service for generation event logging
         if charge_manager is None:
             charge_manager = get_charge_manager()
         db_service = getattr(charge_manager, 'db_service', None)
+        user_service = UserService(db_service) if db_service is not None else None
         
         # Check if model is FREE (TOP-5 cheapest)
         if is_free_model(model_id):
-            logger.info(f"🆓 Model {model_id} is FREE - skipping payment")
+            logger.info("🆓 Model %s is FREE - skipping payment", model_id)
             
             # Log generation start
             request_id = get_request_id()
@@ -138,12 +187,12 @@ async def generate_with_payment(
             else:
                 logger.info("db_service not available - skipping generation event log (complete)")
             
-            return {
-                **gen_result,
-                'charge_task_id': None,
-                'payment_status': 'free_tier',
-                'payment_message': '🆓 FREE модель - генерация бесплатна'
-            }
+            return _attach_payment_info(
+                gen_result,
+                None,
+                'free_tier',
+                '🆓 FREE модель - генерация бесплатна',
+            )
         
         # Paid model - proceed with charging (or apply referral-free uses if available)
         generator = KieGenerator()
@@ -152,20 +201,18 @@ async def generate_with_payment(
         referral_used = False
         referral_uses_left: Optional[int] = None
         try:
-            db = getattr(charge_manager, "db_service", None)
-            if db is not None and amount <= REFERRAL_MAX_RUB:
-                user_service = UserService(db)
-                meta = await user_service.get_metadata(user_id)
-                referral_uses_left = int(meta.get("referral_free_uses", 0) or 0)
-                if referral_uses_left > 0:
-                    await user_service.increment_metadata_counter(user_id, "referral_free_uses", -1, min_value=0)
+            if user_service is not None and amount <= REFERRAL_MAX_RUB:
+                # Single atomic decrement: no read-then-write race between requests
+                remaining = await user_service.consume_metadata_counter(user_id, "referral_free_uses")
+                if remaining is not None:
                     referral_used = True
-                    referral_uses_left -= 1
+                    referral_uses_left = int(remaining)
                     logger.info(
-                        f"🎁 Referral-free used: user={user_id} model={model_id} amount={amount:.2f} cap={REFERRAL_MAX_RUB:.2f} left={referral_uses_left}"
+                        "🎁 Referral-free used: user=%s model=%s amount=%.2f cap=%.2f left=%s",
+                        user_id, model_id, amount, REFERRAL_MAX_RUB, referral_uses_left,
                     )
         except Exception as e:
-            logger.warning(f"Referral-free precheck failed (continuing with normal charging): {e}")
+            logger.warning("Referral-free precheck failed (continuing with normal charging): %s", e)
         
         if referral_used:
             request_id = get_request_id()
@@ -188,7 +235,12 @@ async def generate_with_payment(
                 logger.info("db_service not available - skipping generation event log (referral start)")
             
             start_time = time.time()
-            gen_result = await generator.generate(model_id, user_inputs, progress_callback, timeout)
+            try:
+                gen_result = await generator.generate(model_id, user_inputs, progress_callback, timeout)
+            except BaseException:
+                # Generation crashed: the consumed free use must not be lost
+                await _restore_referral_use(user_service, user_id)
+                raise
             duration_ms = int((time.time() - start_time) * 1000)
         
             success = gen_result.get('success', False)
@@ -224,30 +276,25 @@ async def generate_with_payment(
                 result_urls = gen_result.get('result_urls', [])
                 result_text = '\n'.join(result_urls) if result_urls else 'Success'
                 charge_manager.add_to_history(user_id, model_id, user_inputs, result_text, True)
-                return {
-                    **gen_result,
-                    'charge_task_id': None,
-                    'payment_status': 'referral_free',
-                    'payment_message': f'🎁 Бесплатная генерация за приглашения (осталось: {referral_uses_left})'
-                }
+                return _attach_payment_info(
+                    gen_result,
+                    None,
+                    'referral_free',
+                    f'🎁 Бесплатная генерация за приглашения (осталось: {referral_uses_left})',
+                )
         
             # FAIL/TIMEOUT: return referral use back
-            try:
-                db = getattr(charge_manager, "db_service", None)
-                if db is not None:
-                    await UserService(db).increment_metadata_counter(user_id, "referral_free_uses", +1)
-            except Exception as e:
-                logger.warning(f"Failed to restore referral-free use after failure: {e}")
+            await _restore_referral_use(user_service, user_id)
         
             error_msg = gen_result.get('message', 'Failed')
             charge_manager.add_to_history(user_id, model_id, user_inputs, error_msg, False)
-            return {
-                **gen_result,
-                'charge_task_id': None,
-                'payment_status': 'referral_free_failed',
-                'payment_message': '⚠️ Генерация не удалась, бесплатная попытка возвращена'
-            }
-        charge_task_id = task_id or f"charge_{user_id}_{model_id}_{uuid4().hex[:8]}"
+            return _attach_payment_info(
+                gen_result,
+                None,
+                'referral_free_failed',
+                '⚠️ Генерация не удалась, бесплатная попытка возвращена',
+            )
+        charge_task_id = task_id or f"charge_{user_id}_{model_id}_{secrets.token_hex(4)}"
         
         # Create pending charge
         charge_result = await charge_manager.create_pending_charge(
@@ -261,12 +308,12 @@ async def generate_with_payment(
         if charge_result['status'] == 'already_committed':
             # Already paid, just generate
             gen_result = await generator.generate(model_id, user_inputs, progress_callback, timeout)
-            return {
-                **gen_result,
-                'charge_task_id': charge_task_id,
-                'payment_status': 'already_committed',
-                'payment_message': 'Оплата уже подтверждена'
-            }
+            return _attach_payment_info(
+                gen_result,
+                charge_task_id,
+                'already_committed',
+                'Оплата уже подтверждена',
+            )
         if charge_result['status'] == 'insufficient_balance':
             return {
                 'success': False,
@@ -305,9 +352,9 @@ async def generate_with_payment(
         gen_result = await generator.generate(model_id, user_inputs, progress_callback, timeout)
         duration_ms = int((time.time() - start_time) * 1000)
         
-        # Track metrics
+        # Metrics are tracked concurrently with commit/release (no ordering dependency)
         success = gen_result.get('success', False)
-        await track_generation(
+        metrics = dict(
             model_id=model_id,
             success=success,
             duration=duration_ms / 1000.0,
@@ -316,9 +363,11 @@ async def generate_with_payment(
         
         # Determine task_id from generation (if available)
         # Commit or release charge based on generation result
-        if gen_result.get('success'):
+        if success:
             # SUCCESS: Commit charge
-            commit_result = await charge_manager.commit_charge(charge_task_id)
+            commit_result = await _settle_with_metrics(
+                charge_manager.commit_charge(charge_task_id), metrics
+            )
             
             # Log success
             if db_service:
@@ -342,12 +391,12 @@ async def generate_with_payment(
             result_urls = gen_result.get('result_urls', [])
             result_text = '\n'.join(result_urls) if result_urls else 'Success'
             charge_manager.add_to_history(user_id, model_id, user_inputs, result_text, True)
-            return {
-                **gen_result,
-                'charge_task_id': charge_task_id,
-                'payment_status': commit_result['status'],
-                'payment_message': commit_result['message']
-            }
+            return _attach_payment_info(
+                gen_result,
+                charge_task_id,
+                commit_result['status'],
+                commit_result['message'],
+            )
         else:
             # FAIL/TIMEOUT: Release charge (auto-refund)
             error_code = gen_result.get('error_code', 'generation_failed')
@@ -373,15 +422,14 @@ async def generate_with_payment(
             else:
                 logger.info("db_service not available - skipping generation event log (paid failure)")
             
-            release_result = await charge_manager.release_charge(
-                charge_task_id,
-                reason=error_code
+            release_result = await _settle_with_metrics(
+                charge_manager.release_charge(charge_task_id, reason=error_code), metrics
             )
             # Add to history
             charge_manager.add_to_history(user_id, model_id, user_inputs, error_message, False)
-            return {
-                **gen_result,
-                'charge_task_id': charge_task_id,
-                'payment_status': release_result['status'],
-                'payment_message': release_result['message']
-            }
+            return _attach_payment_info(
+                gen_result,
+                charge_task_id,
+                release_result['status'],
+                release_result['message'],
+            )
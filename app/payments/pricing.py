@@ -168,6 +168,14 @@ def _extract_cost_from_kie_response(kie_response: Dict[str, Any]) -> Optional[Tu
     return None
 
 
+# (keys, converter-to-RUB) in priority order: direct RUB, then USD, then credits
+_MODEL_PRICING_KEYS = (
+    (("rub_per_use", "rub_per_gen", "rub_per_call", "rub", "price_rub"), float),
+    (("usd_per_use", "usd_per_gen", "usd_per_call", "usd", "price_usd"), lambda usd: _to_rub_from_usd(usd)),
+    (("credits_per_use", "credits_per_gen", "credits_per_call", "credits"), lambda credits: _to_rub_from_credits(credits)),
+)
+
+
 def _extract_cost_from_model_pricing(model: Dict[str, Any]) -> Optional[Tuple[float, str]]:
     """Extract base cost from model registry / source_of_truth.
 
@@ -177,35 +185,15 @@ def _extract_cost_from_model_pricing(model: Dict[str, Any]) -> Optional[Tuple[fl
     if not isinstance(pricing, dict):
         pricing = {}
 
-    # Direct RUB
-    for key in ("rub_per_use", "rub_per_gen", "rub_per_call", "rub", "price_rub"):
-        if key in pricing:
-            try:
-                rub = float(pricing[key])
-                if rub >= 0:
-                    return (round(rub, 6), f"model_pricing:{key}")
-            except Exception:
-                continue
-
-    # USD
-    for key in ("usd_per_use", "usd_per_gen", "usd_per_call", "usd", "price_usd"):
-        if key in pricing:
-            try:
-                usd = float(pricing[key])
-                if usd >= 0:
-                    return (round(_to_rub_from_usd(usd), 6), f"model_pricing:{key}")
-            except Exception:
-                continue
-
-    # Credits
-    for key in ("credits_per_use", "credits_per_gen", "credits_per_call", "credits"):
-        if key in pricing:
-            try:
-                credits = float(pricing[key])
-                if credits >= 0:
-                    return (round(_to_rub_from_credits(credits), 6), f"model_pricing:{key}")
-            except Exception:
-                continue
+    for keys, to_rub in _MODEL_PRICING_KEYS:
+        for key in keys:
+            if key in pricing:
+                try:
+                    value = float(pricing[key])
+                    if value >= 0:
+                        return (round(to_rub(value), 6), f"model_pricing:{key}")
+                except Exception:
+                    continue
 
     # Legacy registry field
     legacy_usd = model.get("price")
@@ -12,13 +12,54 @@ fallback по ключам (rub_per_use/rub_per_gen, usd_per_use/usd_per_gen, et
 import json
 import logging
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
 # PRIMARY SOURCE OF TRUTH
 SOURCE_OF_TRUTH = Path("models/KIE_SOURCE_OF_TRUTH.json")
 
+# Backward compatible pricing keys, in priority order
+_USD_KEYS = ("usd_per_use", "usd_per_gen", "usd", "price_usd")
+_CREDITS_KEYS = ("credits_per_use", "credits_per_gen", "credits")
+_RUB_KEYS = ("rub_per_use", "rub_per_gen", "rub")
+
+# Parsed SOURCE_OF_TRUTH + derived lookups, invalidated when path or mtime changes
+_cache: Dict[str, Any] = {
+    "key": None, "models": None, "free_ids": None, "free_set": None, "price_by_id": {},
+}
+
+
+def _load_models() -> Dict[str, Any]:
+    """Return the models dict from SOURCE_OF_TRUTH, re-parsing only when the file changes."""
+    key = (str(SOURCE_OF_TRUTH), SOURCE_OF_TRUTH.stat().st_mtime_ns)
+    if _cache["models"] is not None and _cache["key"] == key:
+        return _cache["models"]
+
+    if orjson is not None:
+        data = orjson.loads(SOURCE_OF_TRUTH.read_bytes())
+    else:
+        with open(SOURCE_OF_TRUTH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    models = data.get("models", {}) or {}
+    _cache.update(key=key, models=models, free_ids=None, free_set=None, price_by_id={})
+    return models
+
+
+def _first_price(pricing: Dict[str, Any], keys: tuple) -> float:
+    """Return the first truthy price among keys as float (0.0 if none)."""
+    for key in keys:
+        value = pricing.get(key)
+        if value:
+            return float(value)
+    return 0.0
+
 
 def get_free_models() -> List[str]:
     """Get list of model_ids that are free to use.
@@ -26,38 +67,69 @@ def get_free_models() -> List[str]:
     Strict режим проекта: FREE_TIER_MODEL_IDS из ENV (по умолчанию 5 дешёвых моделей).
     Fallback: если список пустой — читаем pricing.is_free из SOURCE_OF_TRUTH.
     """
+    return _resolve_free_models()[0]
+
+
+def _resolve_free_models() -> Tuple[List[str], bool]:
+    """get_free_models() plus whether the result may be cached (False on any error path)."""
     try:
         from app.utils.config import get_config
         cfg = get_config()
         ids = [x for x in getattr(cfg, "free_tier_model_ids", []) if x]
         if ids:
             logger.info(f"Loaded {len(ids)} free-tier models from config")
-            return ids
+            return ids, True
     except Exception as e:
         logger.warning(f"Failed to load free-tier models from config: {e}")
+        return _free_models_from_sot()[0], False
 
-    # Fallback to source_of_truth is_free flag
+    return _free_models_from_sot()
+
+
+def _free_models_from_sot() -> Tuple[List[str], bool]:
+    """Fallback to source_of_truth is_free flag."""
     if not SOURCE_OF_TRUTH.exists():
         logger.error(f"Source of truth not found: {SOURCE_OF_TRUTH}")
-        return []
+        return [], False
 
     try:
-        with open(SOURCE_OF_TRUTH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        models_dict = data.get("models", {}) or {}
-        free_model_ids = [
-            model_id
-            for model_id, model in models_dict.items()
-            if (model or {}).get('pricing', {}).get('is_free', False)
-        ]
-
-        logger.info(f"Loaded {len(free_model_ids)} free models from {SOURCE_OF_TRUTH}")
-        return free_model_ids
+        models_dict = _load_models()
+        if _cache["free_ids"] is None:
+            _cache["free_ids"] = [
+                model_id
+                for model_id, model in models_dict.items()
+                if (model or {}).get('pricing', {}).get('is_free', False)
+            ]
+            logger.info(f"Loaded {len(_cache['free_ids'])} free models from {SOURCE_OF_TRUTH}")
+        return list(_cache["free_ids"]), True
     except Exception as e:
         logger.error(f"Failed to load free models: {e}")
-        return []
+        return [], False
+
+
+def get_free_set() -> FrozenSet[str]:
+    """Cached frozenset of get_free_models() for O(1) membership checks.
+
+    Valid while SOURCE_OF_TRUTH is unchanged (_load_models() drops it on a new
+    mtime); results from an error path are returned but never cached.
+    """
+    try:
+        _load_models()
+    except Exception:
+        return frozenset(get_free_models())
+
+    free_set = _cache["free_set"]
+    if free_set is None:
+        free_ids, cacheable = _resolve_free_models()
+        free_set = frozenset(free_ids)
+        if cacheable:
+            _cache["free_set"] = free_set
+    return free_set
+
 
+def invalidate_free_cache() -> None:
+    """Drop cached SOURCE_OF_TRUTH data and FREE lookups (call after SOT/config reload)."""
+    _cache.update(key=None, models=None, free_ids=None, free_set=None, price_by_id={})
 
 
 def is_free_model(model_id: str) -> bool:
@@ -70,8 +142,7 @@ def is_free_model(model_id: str) -> bool:
     Returns:
         True if model is in TOP-5 cheapest
     """
-    free_ids = get_free_models()
-    return model_id in free_ids
+    return model_id in get_free_set()
 
 
 def get_model_price(model_id: str) -> Dict[str, float]:
@@ -90,10 +161,10 @@ def get_model_price(model_id: str) -> Dict[str, float]:
         }
     """
     try:
-        with open(SOURCE_OF_TRUTH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        models_dict = data.get("models", {})
+        models_dict = _load_models()
+        cached = _cache["price_by_id"].get(model_id)
+        if cached is not None:
+            return dict(cached)
         
         # Find model
         model = models_dict.get(model_id)
@@ -110,33 +181,15 @@ def get_model_price(model_id: str) -> Dict[str, float]:
         pricing = model.get("pricing", {})
         is_free = is_free_model(model_id)
         
-        # Backward compatible ключи
-        usd = (
-            pricing.get("usd_per_use")
-            or pricing.get("usd_per_gen")
-            or pricing.get("usd")
-            or pricing.get("price_usd")
-            or 0.0
-        )
-        credits = (
-            pricing.get("credits_per_use")
-            or pricing.get("credits_per_gen")
-            or pricing.get("credits")
-            or 0.0
-        )
-        rub = (
-            pricing.get("rub_per_use")
-            or pricing.get("rub_per_gen")
-            or pricing.get("rub")
-            or 0.0
-        )
-
-        return {
-            "usd_per_use": float(usd or 0.0),
-            "credits_per_use": float(credits or 0.0),
-            "rub_per_use": float(rub or 0.0),
+        price = {
+            "usd_per_use": _first_price(pricing, _USD_KEYS),
+            "credits_per_use": _first_price(pricing, _CREDITS_KEYS),
+            "rub_per_use": _first_price(pricing, _RUB_KEYS),
             "is_free": is_free,
         }
+        if _cache["free_set"] is not None:  # is_free came from a cacheable FREE set
+            _cache["price_by_id"][model_id] = price
+        return dict(price)
     
     except Exception as e:
         logger.error(f"Failed to get price for {model_id}: {e}")
@@ -167,11 +220,8 @@ def get_all_models_by_category() -> Dict[str, List[Dict[str, Any]]]:
         }
     """
     try:
-        with open(SOURCE_OF_TRUTH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        models_dict = data.get("models", {})
-        free_ids = get_free_models()
+        models_dict = _load_models()
+        free_ids = set(get_free_models())
         
         by_category: Dict[str, List[Dict[str, Any]]] = {}
         
@@ -185,12 +235,11 @@ def get_all_models_by_category() -> Dict[str, List[Dict[str, Any]]]:
                 by_category[category] = []
             
             pricing = model.get("pricing", {}) if isinstance(model.get("pricing", {}), dict) else {}
-            rub = pricing.get("rub_per_use") or pricing.get("rub_per_gen") or pricing.get("rub") or 0.0
 
             by_category[category].append({
                 "model_id": model["model_id"],
                 "display_name": model.get("display_name", model["model_id"]),
-                "price_rub": float(rub or 0.0),
+                "price_rub": _first_price(pricing, _RUB_KEYS),
                 "is_free": model["model_id"] in free_ids,
                 "description": model.get("description", "")
             })
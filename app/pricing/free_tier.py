@@ -18,8 +18,9 @@ USAGE:
     # Returns: ['z-image', 'recraft/remove-background', ...]
     # pricing_map contains BASE RUB prices (before markup)
 """
+import heapq
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
@@ -44,40 +45,37 @@ def compute_top5_cheapest(
     Raises:
         ValueError: If insufficient models to form FREE tier
     """
-    # Collect eligible models
-    eligible = []
-    
-    for model_id, model_data in model_registry.items():
-        # Check if model is enabled
-        if not isinstance(model_data, dict):
-            continue
-        
-        if not model_data.get('enabled', True):
-            continue
-        
-        # Check if model has pricing
-        if model_id not in pricing_map:
-            logger.warning(f"Model {model_id} enabled but no price in pricing_map")
-            continue
-        
-        price_rub = pricing_map[model_id]
-        eligible.append((model_id, price_rub))
-    
-    if len(eligible) < count:
+    def _eligible():
+        for model_id, model_data in model_registry.items():
+            # Check if model is enabled
+            if not isinstance(model_data, dict):
+                continue
+            
+            if not model_data.get('enabled', True):
+                continue
+            
+            # Check if model has pricing
+            if model_id not in pricing_map:
+                logger.warning(f"Model {model_id} enabled but no price in pricing_map")
+                continue
+            
+            yield (model_id, pricing_map[model_id])
+    
+    # Partial selection by (price, model_id): O(N log count), deterministic ordering
+    top = heapq.nsmallest(count, _eligible(), key=lambda x: (x[1], x[0]))
+    
+    if len(top) < count:
         raise ValueError(
             f"Insufficient eligible models for FREE tier: "
-            f"need {count}, got {len(eligible)}"
+            f"need {count}, got {len(top)}"
         )
     
-    # Sort by (price, model_id) for deterministic ordering
-    eligible.sort(key=lambda x: (x[1], x[0]))
-    
     # Return top N model IDs
-    top_n = [model_id for model_id, _ in eligible[:count]]
+    top_n = [model_id for model_id, _ in top]
     
     logger.info(
         f"Computed TOP-{count} cheapest models: {top_n} "
-        f"(prices: {[float(eligible[i][1]) for i in range(count)]})"
+        f"(prices: {[float(price) for _, price in top]})"
     )
     
     return top_n
@@ -130,7 +128,8 @@ def get_free_tier_models(
     model_registry: Dict[str, Any],
     pricing_map: Dict[str, Decimal],
     override_env: str = None,
-    count: int = 5
+    count: int = 5,
+    expected: Optional[List[str]] = None,
 ) -> tuple[List[str], bool]:
     """
     Get FREE tier models (auto-computed or from ENV override).
@@ -140,6 +139,7 @@ def get_free_tier_models(
         pricing_map: Pricing map
         override_env: Value from FREE_TIER_MODEL_IDS env (or None)
         count: Expected count
+        expected: Precomputed compute_top5_cheapest() result (skips recomputation)
     
     Returns:
         (free_tier_ids, is_override)
@@ -149,7 +149,8 @@ def get_free_tier_models(
     """
     # If no override, compute and return
     if not override_env or not override_env.strip():
-        expected = compute_top5_cheapest(model_registry, pricing_map, count)
+        if expected is None:
+            expected = compute_top5_cheapest(model_registry, pricing_map, count)
         logger.info(f"FREE tier: auto-computed (TOP-{count} cheapest)")
         return expected, False
     
@@ -168,7 +169,8 @@ def get_free_tier_models(
         
         # Try to compute expected for helpful error message
         try:
-            expected = compute_top5_cheapest(model_registry, pricing_map, count)
+            if expected is None:
+                expected = compute_top5_cheapest(model_registry, pricing_map, count)
             error_msg += f"\nExpected (TOP-{count} cheapest): {expected}\n"
         except ValueError:
             error_msg += f"\n(Cannot compute TOP-{count} cheapest - insufficient models)\n"
@@ -178,7 +180,8 @@ def get_free_tier_models(
     
     # Compute expected for comparison logging
     try:
-        expected = compute_top5_cheapest(model_registry, pricing_map, count)
+        if expected is None:
+            expected = compute_top5_cheapest(model_registry, pricing_map, count)
     except ValueError as e:
         # If we can't compute expected, but override is valid, use override
         logger.warning(f"Cannot compute expected FREE tier: {e}")
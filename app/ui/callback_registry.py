@@ -6,33 +6,34 @@ Long model IDs like 'elevenlabs/text-to-speech-multilingual-v2' exceed this.
 Solution: Generate short keys (prefix:HASH) and maintain in-memory mapping.
 """
 import hashlib
-import base64
 import logging
 from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
-# In-memory registry: short_key -> original_id
+# In-memory registry: short_key -> original_id.
+# No reverse map: short keys are a pure function of (prefix, original_id).
 _registry: Dict[str, str] = {}
-_reverse: Dict[str, str] = {}  # original_id -> short_key
+
+# Prefixes pre-registered for every model: m=model, gen=generation, card=model card
+_MODEL_PREFIXES = ("m", "gen", "card")
 
 
 def _hash_id(raw_id: str) -> str:
-    """Generate short hash from ID (10 chars base64url)."""
-    digest = hashlib.sha1(raw_id.encode('utf-8')).digest()
-    b64 = base64.urlsafe_b64encode(digest[:8]).decode('ascii').rstrip('=')
-    return b64[:10]  # 10 chars max
+    """Generate short hash from ID (10 hex chars, BLAKE2b-40)."""
+    return hashlib.blake2b(raw_id.encode('utf-8'), digest_size=5).hexdigest()
 
 
-def make_key(prefix: str, raw_id: str) -> str:
+def make_key(prefix: str, raw_id: str, short_hash: Optional[str] = None) -> str:
     """
     Create short callback key from prefix and raw ID.
     
-    Format: prefix:HASH (e.g., "m:Ab12Cd34Ef")
+    Format: prefix:HASH (e.g., "m:3fa9c01b7e")
     
     Args:
         prefix: Category prefix (m=model, f=format, etc.)
         raw_id: Original ID (may be long)
+        short_hash: Precomputed _hash_id(raw_id), to hash once for several prefixes
         
     Returns:
         Short key suitable for callback_data (<= 20 chars)
@@ -40,20 +41,16 @@ def make_key(prefix: str, raw_id: str) -> str:
     if not raw_id:
         return prefix
     
-    # Check if already registered
-    cache_key = f"{prefix}:{raw_id}"
-    if cache_key in _reverse:
-        return _reverse[cache_key]
-    
-    # Generate new short key
-    short_hash = _hash_id(raw_id)
+    if short_hash is None:
+        short_hash = _hash_id(raw_id)
     short_key = f"{prefix}:{short_hash}"
     
-    # Register both directions
+    if _registry.get(short_key) == raw_id:
+        return short_key
     _registry[short_key] = raw_id
-    _reverse[cache_key] = short_key
     
-    logger.debug(f"Registered callback: {short_key} -> {raw_id}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Registered callback: {short_key} -> {raw_id}")
     
     return short_key
 
@@ -63,7 +60,7 @@ def resolve_key(key: str) -> Optional[str]:
     Resolve short key back to original ID.
     
     Args:
-        key: Short callback key (e.g., "m:Ab12Cd34Ef")
+        key: Short callback key (e.g., "m:3fa9c01b7e")
         
     Returns:
         Original ID or None if not found
@@ -88,9 +85,11 @@ def init_registry_from_models(models_dict: Dict[str, dict]) -> None:
     logger.info(f"Initializing callback registry with {len(models_dict)} models")
     
     for model_id in models_dict.keys():
-        make_key("m", model_id)  # m: = model
-        make_key("gen", model_id)  # gen: = generation
-        make_key("card", model_id)  # card: = model card
+        if not model_id:
+            continue
+        short_hash = _hash_id(model_id)
+        for prefix in _MODEL_PREFIXES:
+            _registry[f"{prefix}:{short_hash}"] = model_id
     
     logger.info(f"Callback registry initialized: {len(_registry)} keys")
 
@@ -108,6 +107,10 @@ def validate_callback_length(callback_data: str) -> bool:
     Raises:
         ValueError if exceeds limit
     """
+    # ASCII fast path: char count == byte count, no bytes copy needed
+    if len(callback_data) <= 64 and callback_data.isascii():
+        return True
+    
     byte_length = len(callback_data.encode('utf-8'))
     
     if byte_length > 64:
@@ -15,10 +15,13 @@ OVERLAY SYSTEM:
 import json
 import os
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from functools import lru_cache
 from copy import deepcopy
 
+from app.pricing.free_models import invalidate_free_cache
+from app.ui.format_groups import invalidate_popularity_cache
+
 logger = logging.getLogger(__name__)
 
 # UI категории (маркетинг-ориентированные)
@@ -152,9 +155,13 @@ def merge_overlay(model: Dict, model_id: str) -> Dict:
     return merged
 
 
+@lru_cache(maxsize=1)
 def load_models_sot() -> Dict[str, Dict]:
     """
-    Get all models with overlay applied.
+    Get all models with overlay applied (cached; treat as read-only).
+    
+    Both inputs are cached for the process lifetime, so the merged dict is too.
+    Returning the same object lets downstream indexes (popularity) reuse work.
     
     Returns:
         Dict[model_id, merged_model]
@@ -170,6 +177,20 @@ def load_models_sot() -> Dict[str, Dict]:
     return merged_models
 
 
+def reload_models_sot() -> None:
+    """
+    Drop cached SOURCE_OF_TRUTH/overlay data and everything derived from it.
+    
+    Call after the model files change on disk; the next load_models_sot()
+    re-reads them.
+    """
+    _load_source_of_truth.cache_clear()
+    _load_overlay.cache_clear()
+    load_models_sot.cache_clear()
+    invalidate_free_cache()
+    invalidate_popularity_cache()
+
+
 def map_category(sot_category: str) -> str:
     """
     Map SOURCE_OF_TRUTH category to UI category.
@@ -261,10 +282,19 @@ def get_model(model_id: str) -> Optional[Dict]:
     return models.get(model_id)
 
 
+# Counts per UI category for the catalog dict last seen (identity = version,
+# as load_models_sot() returns the same dict until reload).
+_COUNTS_CACHE: Dict[str, Any] = {"models": None, "counts": None}
+
+
 def get_counts() -> Dict[str, int]:
     """Get counts per UI category."""
-    tree = build_ui_tree()
-    return {cat: len(models) for cat, models in tree.items()}
+    models_dict = load_models_sot()
+    if _COUNTS_CACHE["models"] is not models_dict:
+        tree = build_ui_tree()
+        _COUNTS_CACHE["counts"] = {cat: len(models) for cat, models in tree.items()}
+        _COUNTS_CACHE["models"] = models_dict
+    return dict(_COUNTS_CACHE["counts"])
 
 
 def get_all_enabled_models() -> List[Dict]:
@@ -1,48 +1,60 @@
 """Format grouping and sorting helpers."""
+import bisect
 import logging
-from typing import List, Dict, Optional
+from collections import defaultdict
+from typing import Any, List, Dict, NamedTuple, Optional
 
 logger = logging.getLogger(__name__)
 
+_EMPTY: Dict = {}
+
+# Popularity fallback by price: < 10 RUB -> 90, < 50 -> 70, < 200 -> 50, else 30
+_PRICE_THRESHOLDS = (10, 50, 200)
+_PRICE_SCORES = (90, 70, 50, 30)
+
+# Pre-sorted popularity index for the last catalog dict seen. The dict is held
+# by reference, so an identity check is a safe version test (its id cannot be
+# reused while cached). load_models_sot() returns the same dict until
+# app.ui.catalog.reload_models_sot(), which also drops this index.
+_POP_CACHE: Dict[str, Any] = {"models": None, "ranked": None, "grouped": None}
+
+
+class FormatGroup(NamedTuple):
+    emoji: str
+    title: str
+    desc: str
+
+
 # Format groups for catalog organization
-FORMAT_GROUPS = {
-    "text2image": {
-        "emoji": "📝→🖼",
-        "title": "Текст в картинку",
-        "desc": "Креативы, баннеры, иллюстрации"
-    },
-    "image2image": {
-        "emoji": "🖼→🖼",
-        "title": "Редактировать фото",
-        "desc": "Изменить стиль, улучшить, вариации"
-    },
-    "image2video": {
-        "emoji": "🖼→🎥",
-        "title": "Фото в видео",
-        "desc": "Оживить фото, создать анимацию"
-    },
-    "text2video": {
-        "emoji": "📝→🎥",
-        "title": "Текст в видео",
-        "desc": "Генерация видео из промпта"
-    },
-    "audio2text": {
-        "emoji": "🎧→📝",
-        "title": "Аудио в текст",
-        "desc": "Транскрибация, распознавание речи"
-    },
-    "text2audio": {
-        "emoji": "📝→🎧",
-        "title": "Текст в озвучку",
-        "desc": "Голосовые сообщения, звуки"
-    },
-    "tools": {
-        "emoji": "🛠",
-        "title": "Инструменты",
-        "desc": "Фон, апскейл, обработка"
-    }
+FORMAT_GROUPS: Dict[str, FormatGroup] = {
+    "text2image": FormatGroup("📝→🖼", "Текст в картинку", "Креативы, баннеры, иллюстрации"),
+    "image2image": FormatGroup("🖼→🖼", "Редактировать фото", "Изменить стиль, улучшить, вариации"),
+    "image2video": FormatGroup("🖼→🎥", "Фото в видео", "Оживить фото, создать анимацию"),
+    "text2video": FormatGroup("📝→🎥", "Текст в видео", "Генерация видео из промпта"),
+    "audio2text": FormatGroup("🎧→📝", "Аудио в текст", "Транскрибация, распознавание речи"),
+    "text2audio": FormatGroup("📝→🎧", "Текст в озвучку", "Голосовые сообщения, звуки"),
+    "tools": FormatGroup("🛠", "Инструменты", "Фон, апскейл, обработка"),
 }
 
+_GROUP_KEYS = tuple(FORMAT_GROUPS)
+_VALID_GROUPS = frozenset(_GROUP_KEYS)
+
+
+# (substring tokens, format group) in priority order
+_CATEGORY_RULES = (
+    (("text-to-image", "t2i"), "text2image"),
+    (("image-to-image", "i2i"), "image2image"),
+    (("image-to-video",), "image2video"),
+    (("text-to-video",), "text2video"),
+    (("audio-to-text", "stt", "transcription"), "audio2text"),
+    (("text-to-audio", "tts", "text-to-speech"), "text2audio"),
+    (("upscale", "background", "enhance"), "tools"),
+)
+
+# Raw category -> format group; seeded with canonical SOT categories and filled
+# lazily for anything else, so lowering + substring rules run once per category.
+_CATEGORY_TO_GROUP: Dict[str, str] = {}
+
 
 def get_format_group(model: Dict) -> str:
     """
@@ -55,28 +67,36 @@ def get_format_group(model: Dict) -> str:
         Format group key (text2image, image2video, tools, etc.)
     """
     # Check UI overlay first
-    if "ui" in model and "format_group" in model["ui"]:
-        return model["ui"]["format_group"]
-    
-    # Fallback: infer from category
-    category = model.get("category", "").lower()
+    format_group = (model.get("ui") or _EMPTY).get("format_group")
+    if format_group is not None:
+        return format_group
     
-    if "text-to-image" in category or "t2i" in category:
-        return "text2image"
-    elif "image-to-image" in category or "i2i" in category:
-        return "image2image"
-    elif "image-to-video" in category:
-        return "image2video"
-    elif "text-to-video" in category:
-        return "text2video"
-    elif "audio-to-text" in category or "stt" in category or "transcription" in category:
-        return "audio2text"
-    elif "text-to-audio" in category or "tts" in category or "text-to-speech" in category:
-        return "text2audio"
-    elif "upscale" in category or "background" in category or "enhance" in category:
-        return "tools"
-    else:
-        return "tools"  # Default fallback
+    # Fallback: infer from category (one dict hit for any category seen before;
+    # keyed on the raw string, so .lower() only runs on a miss)
+    category = model.get("category", "")
+    group = _CATEGORY_TO_GROUP.get(category)
+    if group is None:
+        group = _infer_group_from_category(category.lower())
+        _CATEGORY_TO_GROUP[category] = group
+    return group
+
+
+def _infer_group_from_category(category: str) -> str:
+    """Substring rules for free-text categories, checked in priority order."""
+    for tokens, group in _CATEGORY_RULES:
+        if any(token in category for token in tokens):
+            return group
+    return "tools"  # Default fallback
+
+
+_CATEGORY_TO_GROUP.update(
+    (category, _infer_group_from_category(category))
+    for category in (
+        "text-to-image", "image-to-image", "image-to-video", "text-to-video",
+        "video-to-video", "audio-to-text", "text-to-audio", "audio",
+        "image-processing", "audio-processing", "other", "",
+    )
+)
 
 
 def get_popular_score(model: Dict) -> int:
@@ -90,22 +110,13 @@ def get_popular_score(model: Dict) -> int:
         Score 0-100
     """
     # Check UI overlay
-    if "ui" in model and "popular_score" in model["ui"]:
-        return model["ui"]["popular_score"]
-    
-    # Fallback heuristic: cheaper + faster = more popular
-    pricing = model.get("pricing", {})
-    rub_per_gen = pricing.get("rub_per_gen", 999999)
+    score = (model.get("ui") or _EMPTY).get("popular_score")
+    if score is not None:
+        return score
     
-    # Simple heuristic: cheaper = more popular
-    if rub_per_gen < 10:
-        return 90
-    elif rub_per_gen < 50:
-        return 70
-    elif rub_per_gen < 200:
-        return 50
-    else:
-        return 30
+    # Fallback heuristic: cheaper = more popular
+    rub_per_gen = model.get("pricing", _EMPTY).get("rub_per_gen", 999999)
+    return _PRICE_SCORES[bisect.bisect_right(_PRICE_THRESHOLDS, rub_per_gen)]
 
 
 def group_by_format(models: Dict[str, Dict]) -> Dict[str, List[Dict]]:
@@ -118,23 +129,37 @@ def group_by_format(models: Dict[str, Dict]) -> Dict[str, List[Dict]]:
     Returns:
         Dict[format_group, List[model]]
     """
-    groups = {key: [] for key in FORMAT_GROUPS.keys()}
-    
-    for model_id, model in models.items():
-        if not model.get("enabled", True):
-            continue
-        
-        format_group = get_format_group(model)
-        if format_group not in groups:
-            format_group = "tools"  # Fallback
-        
-        groups[format_group].append(model)
+    ranked = _ranked_models(models)
+    grouped = _POP_CACHE["grouped"]
+    if grouped is None:
+        grouped = defaultdict(list)
+        # Single pass over the pre-sorted index keeps popularity order per group
+        for model in ranked:
+            format_group = get_format_group(model)
+            grouped[format_group if format_group in _VALID_GROUPS else "tools"].append(model)
+        _POP_CACHE["grouped"] = grouped
     
-    # Sort each group by popular_score
-    for group_key in groups:
-        groups[group_key].sort(key=lambda m: get_popular_score(m), reverse=True)
-    
-    return groups
+    # Fresh lists per call: callers may reorder/trim their copy
+    return {key: list(grouped.get(key, ())) for key in _GROUP_KEYS}
+
+
+def _ranked_models(models: Dict[str, Dict]) -> List[Dict]:
+    """Enabled models sorted by popular_score desc (stable), cached per catalog."""
+    if _POP_CACHE["models"] is not models:
+        # Score once per model; the sort only compares cached keys
+        scored = [(get_popular_score(m), m) for m in models.values() if m.get("enabled", True)]
+        scored.sort(key=lambda t: t[0], reverse=True)
+        _POP_CACHE["models"] = models
+        _POP_CACHE["ranked"] = [m for _, m in scored]
+        _POP_CACHE["grouped"] = None
+    return _POP_CACHE["ranked"]
+
+
+def invalidate_popularity_cache() -> None:
+    """Drop the cached popularity index (call after editing a catalog in place)."""
+    _POP_CACHE["models"] = None
+    _POP_CACHE["ranked"] = None
+    _POP_CACHE["grouped"] = None
 
 
 def get_popular_models(models: Dict[str, Dict], limit: int = 10) -> List[Dict]:
@@ -148,6 +173,4 @@ def get_popular_models(models: Dict[str, Dict], limit: int = 10) -> List[Dict]:
     Returns:
         List of models sorted by popularity
     """
-    enabled = [m for m in models.values() if m.get("enabled", True)]
-    enabled.sort(key=lambda m: get_popular_score(m), reverse=True)
-    return enabled[:limit]
+    return _ranked_models(models)[:max(0, limit)]
@@ -2,7 +2,7 @@
 import json
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
@@ -156,27 +156,34 @@ def get_popular_models(
     Returns:
         List of model configs sorted by popularity
     """
-    # Load curated list
-    curated = _load_curated_popular()
+    return _rank_models(
+        _format_models(models, format_key), _load_curated_popular(), format_key, limit
+    )
+
+
+def _format_models(models: Dict[str, Any], format_key: Optional[str]) -> List[Dict[str, Any]]:
+    """Enabled models of a format (all enabled models if format_key is empty)."""
+    if not format_key:
+        return [m for m in models.values() if m.get("enabled", True)]
     
-    if format_key:
-        # Filter by format
-        format_models = []
-        for model_id, model_config in models.items():
-            if not model_config.get("enabled", True):
-                continue
-            
-            model_format = get_model_format(model_config)
-            if model_format and model_format.key == format_key:
-                format_models.append(model_config)
+    format_models = []
+    for model_config in models.values():
+        if not model_config.get("enabled", True):
+            continue
         
-        available_models = format_models
-    else:
-        available_models = [
-            m for m in models.values()
-            if m.get("enabled", True)
-        ]
-    
+        model_format = get_model_format(model_config)
+        if model_format and model_format.key == format_key:
+            format_models.append(model_config)
+    return format_models
+
+
+def _rank_models(
+    available_models: List[Dict[str, Any]],
+    curated: Dict[str, Any],
+    format_key: Optional[str],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """Score and sort already-filtered models (see get_popular_models)."""
     # Score models
     scored_models = []
     for model in available_models:
@@ -258,6 +265,56 @@ def get_recommended_models(
         List of recommended model configs
     """
     curated = _load_curated_popular()
+    return _pick_recommended(
+        models,
+        curated,
+        format_key,
+        limit,
+        lambda: get_popular_models(models, limit=limit, format_key=format_key),
+    )
+
+
+def scan_models_for_format(
+    models: Dict[str, Any],
+    format_key: str,
+    recommended_limit: int = 3,
+    popular_limit: int = 8,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Everything a format page needs from one catalog scan.
+    
+    Equivalent to filtering the format's models, then calling
+    get_recommended_models() and get_popular_models(), but the catalog is
+    filtered, curated_popular.json is read and the models are ranked once.
+    
+    Args:
+        models: Dictionary of model configs
+        format_key: Format key
+        recommended_limit: Maximum number of recommended models
+        popular_limit: Maximum number of popular models
+    
+    Returns:
+        (format_models, recommended, popular)
+    """
+    curated = _load_curated_popular()
+    format_models = _format_models(models, format_key)
+    ranked = _rank_models(
+        format_models, curated, format_key, max(popular_limit, recommended_limit)
+    )
+    recommended = _pick_recommended(
+        models, curated, format_key, recommended_limit, lambda: ranked[:recommended_limit]
+    )
+    return format_models, recommended, ranked[:popular_limit]
+
+
+def _pick_recommended(
+    models: Dict[str, Any],
+    curated: Dict[str, Any],
+    format_key: str,
+    limit: int,
+    popular: Callable[[], List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """Curated picks for the format, topped up from popular() when short."""
     rec_ids = curated.get("recommended_by_format", {}).get(format_key, [])
     
     recommended = []
@@ -267,9 +324,12 @@ def get_recommended_models(
     
     # If not enough from curated, fill with popular from format
     if len(recommended) < limit:
-        popular = get_popular_models(models, limit=limit, format_key=format_key)
-        for model in popular:
-            if model not in recommended:
+        # Dedupe by model_id: a set hit instead of comparing whole model dicts
+        seen_ids = {m.get("model_id") for m in recommended}
+        for model in popular():
+            model_id = model.get("model_id")
+            if model_id not in seen_ids:
+                seen_ids.add(model_id)
                 recommended.append(model)
             if len(recommended) >= limit:
                 break
@@ -1,5 +1,9 @@
 """Единый Tone of Voice и терминология для всего бота."""
 
+import bisect
+import re
+from functools import lru_cache
+
 # === КНОПКИ / CTA ===
 BTN_START = "🚀 Начать"
 BTN_GENERATE = "🚀 Запустить"
@@ -82,6 +86,11 @@ MSG_BUTTON_OUTDATED = (
     "Открываю главное меню..."
 )
 
+# Без HTML-разметки и переносов: для callback.answer() (toast)
+MSG_BUTTON_OUTDATED_PLAIN = (
+    MSG_BUTTON_OUTDATED.replace("<b>", "").replace("</b>", "").replace("\n\n", " ")
+)
+
 MSG_FILE_ACCEPTED = "✅ <b>Файл принят!</b>\n\n📎 {field_name}"
 MSG_URL_ACCEPTED = "✅ <b>Ссылка принята!</b>\n\n🔗 {field_name}"
 
@@ -140,52 +149,69 @@ ERROR_UNKNOWN = "❌ Произошла ошибка. Обратитесь в п
 
 # === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
 
+def _to_percent_template(template: str) -> str:
+    """Перевод {name} -> %(name)s (один раз при импорте: `%` с dict не парсит format-spec)."""
+    return re.sub(r"\{(\w+)\}", r"%(\1)s", template.replace("%", "%%"))
+
+
+_MODEL_CARD_PCT = _to_percent_template(MSG_MODEL_CARD_TEMPLATE)
+
+
+def render_model_card(**fields: str) -> str:
+    """MSG_MODEL_CARD_TEMPLATE с подставленными полями."""
+    return _MODEL_CARD_PCT % fields
+
+
+# В каталоге ~42 различных цены: кэш превращает повторные рендеры в dict lookup
+@lru_cache(maxsize=256)
 def format_price(price_rub: float) -> str:
     """Форматирование цены."""
     if price_rub == 0:
         return PRICE_FREE
-    return PRICE_TEMPLATE.format(amount=f"{price_rub:.2f}")
+    return PRICE_TEMPLATE.format(amount="%.2f" % price_rub)
+
+
+# rank <= 5 -> HIGH, <= 15 -> MEDIUM, <= 30 -> LOW, иначе UNKNOWN
+_POP_THRESHOLDS = (5, 15, 30)
+_POP_LABELS = (POPULARITY_HIGH, POPULARITY_MEDIUM, POPULARITY_LOW, POPULARITY_UNKNOWN)
 
 
 def format_popularity(rank: int) -> str:
     """Форматирование популярности."""
-    if rank <= 5:
-        return POPULARITY_HIGH
-    elif rank <= 15:
-        return POPULARITY_MEDIUM
-    elif rank <= 30:
-        return POPULARITY_LOW
-    return POPULARITY_UNKNOWN
+    return _POP_LABELS[bisect.bisect_left(_POP_THRESHOLDS, rank)]
+
+
+_EMOJI_BY_INPUT_TYPE = {
+    "TEXT": EMOJI_TEXT,
+    "IMAGE_URL": EMOJI_IMAGE,
+    "IMAGE_FILE": EMOJI_IMAGE,
+    "VIDEO_URL": EMOJI_VIDEO,
+    "VIDEO_FILE": EMOJI_VIDEO,
+    "AUDIO_URL": EMOJI_AUDIO,
+    "AUDIO_FILE": EMOJI_AUDIO,
+    "NUMBER": EMOJI_NUMBER,
+    "ENUM": EMOJI_ENUM,
+    "BOOLEAN": EMOJI_BOOLEAN,
+}
+
+_HINT_BY_INPUT_TYPE = {
+    "TEXT": HINT_TEXT,
+    "IMAGE_URL": HINT_IMAGE_FILE,
+    "IMAGE_FILE": HINT_IMAGE_FILE,
+    "VIDEO_URL": HINT_VIDEO_FILE,
+    "VIDEO_FILE": HINT_VIDEO_FILE,
+    "AUDIO_URL": HINT_AUDIO_FILE,
+    "AUDIO_FILE": HINT_AUDIO_FILE,
+    "NUMBER": HINT_NUMBER,
+    "ENUM": HINT_ENUM,
+}
 
 
 def get_emoji_for_input_type(input_type: str) -> str:
     """Получить эмоджи для типа инпута."""
-    mapping = {
-        "TEXT": EMOJI_TEXT,
-        "IMAGE_URL": EMOJI_IMAGE,
-        "IMAGE_FILE": EMOJI_IMAGE,
-        "VIDEO_URL": EMOJI_VIDEO,
-        "VIDEO_FILE": EMOJI_VIDEO,
-        "AUDIO_URL": EMOJI_AUDIO,
-        "AUDIO_FILE": EMOJI_AUDIO,
-        "NUMBER": EMOJI_NUMBER,
-        "ENUM": EMOJI_ENUM,
-        "BOOLEAN": EMOJI_BOOLEAN,
-    }
-    return mapping.get(input_type, "📝")
+    return _EMOJI_BY_INPUT_TYPE.get(input_type, "📝")
 
 
 def get_hint_for_input_type(input_type: str) -> str:
     """Получить подсказку для типа инпута."""
-    mapping = {
-        "TEXT": HINT_TEXT,
-        "IMAGE_URL": HINT_IMAGE_FILE,
-        "IMAGE_FILE": HINT_IMAGE_FILE,
-        "VIDEO_URL": HINT_VIDEO_FILE,
-        "VIDEO_FILE": HINT_VIDEO_FILE,
-        "AUDIO_URL": HINT_AUDIO_FILE,
-        "AUDIO_FILE": HINT_AUDIO_FILE,
-        "NUMBER": HINT_NUMBER,
-        "ENUM": HINT_ENUM,
-    }
-    return mapping.get(input_type, "")
+    return _HINT_BY_INPUT_TYPE.get(input_type, "")
@@ -10,18 +10,40 @@ from __future__ import annotations
 
 import time
 import threading
-from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
 
-_LOCK = threading.Lock()
-
-@dataclass
+@dataclass(slots=True)
 class IdemEntry:
-    created_at: float
+    created_at: float  # time.monotonic()
     status: str  # 'started' | 'done' | 'failed'
     value: Optional[dict] = None
+    expires_at: float = float('inf')
+
+@dataclass(slots=True)
+class _Shard:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    store: OrderedDict[str, IdemEntry] = field(default_factory=OrderedDict)
+
+# Keys are spread over independent (lock, store) shards so unrelated users
+# never wait on each other's lock.
+#
+# Expiry is checked lazily when a key is read; the LRU cap below bounds memory
+# and cleanup_old_keys() (periodic recovery task) sweeps the rest, so the
+# request path never scans.
+_SHARD_COUNT = 16  # power of two: shard index is a mask
+_SHARDS = tuple(_Shard() for _ in range(_SHARD_COUNT))
+
+# Hard cap on live keys (split evenly across shards); least recently used
+# entries are evicted first so a burst cannot grow the store without bound.
+_MAX_ENTRIES = 10_000
+_SHARD_MAX = _MAX_ENTRIES // _SHARD_COUNT
+
+
+def _shard(key: str) -> _Shard:
+    return _SHARDS[hash(key) & (_SHARD_COUNT - 1)]
 
-_STORE: Dict[str, IdemEntry] = {}
 
 def idem_try_start(key: str, ttl_s: float = 120.0) -> Tuple[bool, Optional[IdemEntry]]:
     """
@@ -30,24 +52,30 @@ def idem_try_start(key: str, ttl_s: float = 120.0) -> Tuple[bool, Optional[IdemE
     Returns:
         (started, existing_entry)
     """
-    now = time.time()
-    with _LOCK:
-        # purge expired
-        expired = [k for k,v in _STORE.items() if now - v.created_at > ttl_s]
-        for k in expired:
-            _STORE.pop(k, None)
-
-        if key in _STORE:
-            return False, _STORE[key]
-
-        _STORE[key] = IdemEntry(created_at=now, status='started', value=None)
+    now = time.monotonic()
+    shard = _shard(key)
+    store = shard.store
+    with shard.lock:
+        existing = store.get(key)
+        if existing is not None:
+            if existing.expires_at > now:
+                store.move_to_end(key)
+                return False, existing
+            del store[key]  # expired: treat as absent
+
+        if len(store) >= _SHARD_MAX:
+            store.popitem(last=False)
+        store[key] = IdemEntry(created_at=now, status='started', value=None, expires_at=now + ttl_s)
         return True, None
 
 def idem_finish(key: str, status: str, value: Optional[dict] = None) -> None:
-    with _LOCK:
-        if key in _STORE:
-            _STORE[key].status = status
-            _STORE[key].value = value
+    shard = _shard(key)
+    with shard.lock:
+        entry = shard.store.get(key)
+        if entry is not None:
+            shard.store.move_to_end(key)
+            entry.status = status
+            entry.value = value
 
 
 def build_generation_key(user_id: int, model_id: str, inputs: dict) -> str:
@@ -81,24 +109,39 @@ def build_generation_key(user_id: int, model_id: str, inputs: dict) -> str:
 
 
 def idem_get(key: str) -> Optional[IdemEntry]:
-    with _LOCK:
-        return _STORE.get(key)
+    shard = _shard(key)
+    with shard.lock:
+        entry = shard.store.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del shard.store[key]
+            return None
+        shard.store.move_to_end(key)
+        return entry
 
 
 def cleanup_old_keys(max_age_seconds: float) -> int:
-    """Clean up old idempotency keys.
+    """Clean up old idempotency keys (older than max_age or past their own TTL).
     
     Returns: Number of keys cleaned up
     """
-    now = time.time()
-    with _LOCK:
-        expired = [k for k, v in _STORE.items() if now - v.created_at > max_age_seconds]
-        for k in expired:
-            _STORE.pop(k, None)
-        return len(expired)
+    now = time.monotonic()
+    removed = 0
+    for shard in _SHARDS:
+        with shard.lock:
+            expired = [
+                k for k, v in shard.store.items()
+                if v.expires_at <= now or now - v.created_at > max_age_seconds
+            ]
+            for k in expired:
+                shard.store.pop(k, None)
+            removed += len(expired)
+    return removed
 
 
 def clear_all_keys() -> None:
     """Clear all idempotency keys (called on shutdown)."""
-    with _LOCK:
-        _STORE.clear()
+    for shard in _SHARDS:
+        with shard.lock:
+            shard.store.clear()
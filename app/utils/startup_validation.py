@@ -14,8 +14,10 @@ from __future__ import annotations
 
 import json
 import logging
+from collections import ChainMap
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.payments.pricing import (
     calculate_kie_cost,
@@ -25,27 +27,23 @@ from app.payments.pricing import (
 
 logger = logging.getLogger(__name__)
 
-def _load_allowed_model_ids() -> list[str]:
-    try:
-        p = Path("models/ALLOWED_MODEL_IDS.txt")
-        if not p.exists():
-            return []
-        ids=[]
-        for line in p.read_text(encoding="utf-8").splitlines():
-            s=line.strip()
-            if not s or s.startswith("#"):
-                continue
-            ids.append(s)
-        seen=set()
-        out=[]
-        for mid in ids:
-            if mid in seen:
-                continue
-            seen.add(mid)
-            out.append(mid)
-        return out
-    except Exception:
-        return []
+_ALLOWED: Optional[frozenset[str]] = None
+
+
+def allowed_model_ids() -> frozenset[str]:
+    """Canonical allowlist from models/ALLOWED_MODEL_IDS.txt (read once per process)."""
+    global _ALLOWED
+    if _ALLOWED is None:
+        try:
+            p = Path("models/ALLOWED_MODEL_IDS.txt")
+            text = p.read_text(encoding="utf-8") if p.exists() else ""
+            _ALLOWED = frozenset(
+                s for line in text.splitlines()
+                if (s := line.strip()) and not s.startswith("#")
+            )
+        except Exception:
+            _ALLOWED = frozenset()
+    return _ALLOWED
 
 
 SOURCE_OF_TRUTH_PATH = Path("models/KIE_SOURCE_OF_TRUTH.json")
@@ -57,12 +55,20 @@ class StartupValidationError(Exception):
     """Raised when startup validation fails."""
 
 
+@lru_cache(maxsize=1)
+def _load_sot_cached(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse SOURCE_OF_TRUTH once per file version (mtime is part of the key)."""
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
 def load_source_of_truth() -> Dict[str, Any]:
-    if not SOURCE_OF_TRUTH_PATH.exists():
+    try:
+        mtime_ns = SOURCE_OF_TRUTH_PATH.stat().st_mtime_ns
+    except OSError:
         raise StartupValidationError(f"Source of truth не найден: {SOURCE_OF_TRUTH_PATH}")
 
     try:
-        data = json.loads(SOURCE_OF_TRUTH_PATH.read_text(encoding="utf-8"))
+        data = _load_sot_cached(str(SOURCE_OF_TRUTH_PATH), mtime_ns)
     except json.JSONDecodeError as e:
         raise StartupValidationError(f"Source of truth содержит невалидный JSON: {e}")
 
@@ -75,25 +81,35 @@ def load_source_of_truth() -> Dict[str, Any]:
     return data
 
 
-def _enabled_models(models_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for model_id, model in models_dict.items():
+def _scan_models(
+    models_dict: Dict[str, Any],
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[str]]:
+    """Single pass over SOURCE_OF_TRUTH: ((model_id, model) enabled pairs, ids flagged is_free)."""
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    is_free_ids: List[str] = []
+    for key, model in models_dict.items():
         if not isinstance(model, dict):
             continue
+        # tolerate: some files may key by model_id and omit duplicated field
+        model_id = str(model.get("model_id") or key)
+        if model.get("pricing", {}).get("is_free") is True:
+            is_free_ids.append(model_id)
         if not model.get("enabled", True):
             continue
-        if model.get("model_id") is None:
-            # tolerate: some files may key by model_id and omit duplicated field
-            model = dict(model)
-            model["model_id"] = model_id
-        out.append(model)
-    return out
+        out.append((model_id, model))
+    return out, is_free_ids
+
+
+def _enabled_models(models_dict: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    return _scan_models(models_dict)[0]
 
 
-def _model_base_cost_pairs(models: List[Dict[str, Any]]) -> List[Tuple[str, float]]:
+def _model_base_cost_pairs(items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, float]]:
     pairs: List[Tuple[str, float]] = []
-    for m in models:
-        mid = str(m.get("model_id") or "")
+    for mid, m in items:
+        if m.get("model_id") is None:
+            # pricing fallbacks look up model_id; overlay it without copying the model
+            m = ChainMap({"model_id": mid}, m)
         base = calculate_kie_cost(m, user_inputs={}, kie_response=None)
         if base is None:
             continue
@@ -103,9 +119,13 @@ def _model_base_cost_pairs(models: List[Dict[str, Any]]) -> List[Tuple[str, floa
     return pairs
 
 
-def validate_models(data: Dict[str, Any]) -> None:
+def validate_models(
+    data: Dict[str, Any],
+    enabled: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+) -> None:
     models_dict = data.get("models", {})
-    enabled = _enabled_models(models_dict)
+    if enabled is None:
+        enabled = _enabled_models(models_dict)
     if not enabled:
         raise StartupValidationError("Нет enabled моделей в source of truth")
 
@@ -120,12 +140,17 @@ def validate_models(data: Dict[str, Any]) -> None:
     logger.info(f"✅ Models with valid pricing: {len(pairs)}")
 
 
-def validate_free_tier(data: Dict[str, Any], pricing_map: Dict[str, Any]) -> None:
+def validate_free_tier(
+    data: Dict[str, Any],
+    pricing_map: Dict[str, Any],
+    is_free_in_file: Optional[List[str]] = None,
+) -> None:
     """FREE tier validation using auto-derivation.
     
     Args:
         data: SOURCE_OF_TRUTH data
         pricing_map: Pricing map (model_id -> price_rub)
+        is_free_in_file: Precomputed is_free ids (from _scan_models); scanned if None
     
     Raises:
         StartupValidationError: If FREE tier mismatch with helpful message
@@ -147,21 +172,17 @@ def validate_free_tier(data: Dict[str, Any], pricing_map: Dict[str, Any]) -> Non
     override_env = os.getenv("FREE_TIER_MODEL_IDS")
     try:
         actual, is_override = get_free_tier_models(
-            models_dict, pricing_map, override_env, count=FREE_TIER_COUNT
+            models_dict, pricing_map, override_env, count=FREE_TIER_COUNT, expected=expected
         )
     except ValueError as e:
         raise StartupValidationError(f"FREE tier configuration error: {e}")
     
     # Check is_free flags in SOURCE_OF_TRUTH (informational only)
-    is_free_in_file = []
-    for mid, model in models_dict.items():
-        if not isinstance(model, dict):
-            continue
-        pricing = model.get("pricing", {})
-        if pricing.get("is_free") is True:
-            is_free_in_file.append(str(model.get("model_id") or mid))
+    if is_free_in_file is None:
+        is_free_in_file = _scan_models(models_dict)[1]
     
-    if is_free_in_file and set(is_free_in_file) != set(expected):
+    expected_set = frozenset(expected)
+    if is_free_in_file and frozenset(is_free_in_file) != expected_set:
         logger.warning(
             f"⚠️ is_free flags in SOURCE_OF_TRUTH mismatch:\n"
             f"  File: {sorted(is_free_in_file)}\n"
@@ -170,7 +191,7 @@ def validate_free_tier(data: Dict[str, Any], pricing_map: Dict[str, Any]) -> Non
         )
     
     # If override is used and differs from expected, log warning (not error)
-    if is_override and set(actual) != set(expected):
+    if is_override and frozenset(actual) != expected_set:
         logger.warning(
             f"FREE_TIER_MODEL_IDS override in use (differs from auto-computed):\n"
             f"  Override: {actual}\n"
@@ -198,7 +219,7 @@ def validate_startup() -> None:
     data = load_source_of_truth()
 
     # Canonical allowlist check (must be exactly 42 model_ids)
-    allowed = _load_allowed_model_ids()
+    allowed = allowed_model_ids()
     if allowed and len(allowed) != 42:
         raise RuntimeError(f"ALLOWLIST must contain exactly 42 model_ids, got {len(allowed)}")
 
@@ -211,8 +232,10 @@ def validate_startup() -> None:
     pc.load_truth()
     pricing_map = {mid: Decimal(str(rub)) for mid, (usd, rub) in pc._pricing_map.items()}
 
-    validate_models(data)
-    validate_free_tier(data, pricing_map)
+    # One pass over the models feeds both validators
+    enabled, is_free_in_file = _scan_models(data.get("models", {}))
+    validate_models(data, enabled)
+    validate_free_tier(data, pricing_map, is_free_in_file)
     validate_pricing_formula()
 
     logger.info("✅ Startup validation PASSED - бот готов к запуску")
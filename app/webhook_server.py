@@ -3,24 +3,109 @@ from __future__ import annotations
 import asyncio
 import hashlib
 import hmac
+import json
 import logging
 import os
+import ssl
 import time
+from collections import OrderedDict
 from typing import Optional, Tuple, Dict, Any
-from datetime import datetime, timedelta
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from app.utils.healthcheck import get_health_state
+from app.utils.metrics import get_system_metrics
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
 
 log = logging.getLogger("webhook")
 
 
-# Media proxy cache (in-memory, TTL 10 min)
-_media_proxy_cache: Dict[str, Tuple[str, datetime]] = {}
-_CACHE_TTL = timedelta(minutes=10)
+# Media proxy cache (in-memory LRU, TTL 10 min): file_id -> (file_path, cached_at monotonic)
+# No lock needed: lookups and mutations never straddle an await on the event loop.
+_media_proxy_cache: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+_CACHE_TTL_SECONDS = 600.0
+_CACHE_MAX = 10_000
+
+# Single-flight: concurrent misses for one file_id share a single bot.get_file call
+_media_proxy_inflight: Dict[str, asyncio.Future] = {}
+
+
+async def _resolve_file_path(bot: Bot, file_id: str) -> str:
+    """Resolve and cache file_path, coalescing concurrent lookups of the same file_id."""
+    fut = _media_proxy_inflight.get(file_id)
+    if fut is not None:
+        # shield: a cancelled waiter must not cancel the shared lookup
+        return await asyncio.shield(fut)
+
+    fut = asyncio.get_running_loop().create_future()
+    _media_proxy_inflight[file_id] = fut
+    try:
+        file_path = (await bot.get_file(file_id)).file_path
+    except BaseException as e:
+        # Waiters get an ordinary error even if this (leader) request was cancelled
+        fut.set_exception(e if isinstance(e, Exception) else RuntimeError("file resolve cancelled"))
+        fut.exception()  # mark retrieved: no warning when nobody was waiting
+        raise
+    finally:
+        _media_proxy_inflight.pop(file_id, None)
+
+    # Cache it (evict least recently used past the cap)
+    _media_proxy_cache[file_id] = (file_path, time.monotonic())
+    _media_proxy_cache.move_to_end(file_id)
+    if len(_media_proxy_cache) > _CACHE_MAX:
+        _media_proxy_cache.popitem(last=False)
+    fut.set_result(file_path)
+    return file_path
+
+
+def create_bot_session() -> AiohttpSession:
+    """Outbound Telegram API session with a bounded connection pool.
+
+    Env:
+        TELEGRAM_HTTP_LIMIT: total simultaneous connections (default 100)
+        TELEGRAM_HTTP_LIMIT_PER_HOST: per-host cap (default 50)
+        TELEGRAM_HTTP_TIMEOUT: request timeout, seconds (default 60)
+    """
+    session = AiohttpSession(
+        limit=int(os.getenv("TELEGRAM_HTTP_LIMIT", "100")),
+        timeout=float(os.getenv("TELEGRAM_HTTP_TIMEOUT", "60")),
+    )
+    # aiogram builds its TCPConnector lazily from this private kwargs dict (aiogram
+    # internals, not public API: requirements allow any aiogram>=3.4.1). Only add
+    # limit_per_host; aiogram's own entries (e.g. ttl_dns_cache) are kept as-is.
+    session._connector_init["limit_per_host"] = int(os.getenv("TELEGRAM_HTTP_LIMIT_PER_HOST", "50"))
+    return session
+
+
+def _json_response(data: Any, status: int = 200) -> web.Response:
+    """web.json_response equivalent; serializes with orjson when available."""
+    if orjson is None:
+        return web.json_response(data, status=status)
+    return web.Response(
+        body=orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS),
+        content_type="application/json",
+        status=status,
+    )
+
+
+def _git_commit() -> str:
+    """Short git commit hash of the deployed tree, or "unknown"."""
+    import subprocess
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            timeout=1
+        ).decode().strip()
+    except Exception:
+        return "unknown"
 
 
 def _default_secret(token: str) -> str:
@@ -30,30 +115,64 @@ def _default_secret(token: str) -> str:
 
 def mask_path(path: str) -> str:
     """Mask secret in path for logging (show first 4 and last 4 chars of secret part)."""
-    if "/webhook/" in path:
-        parts = path.split("/webhook/")
-        if len(parts) > 1 and parts[1]:
-            secret_part = parts[1].split("/")[0]  # Get secret before any additional path
-            if len(secret_part) > 8:
-                masked = secret_part[:4] + "****" + secret_part[-4:]
-                return f"/webhook/{masked}"
+    idx = path.find("/webhook/")
+    if idx < 0:
+        return path
+    start = idx + 9  # len("/webhook/")
+    end = path.find("/", start)  # Get secret before any additional path
+    secret_part = path[start:] if end < 0 else path[start:end]
+    if len(secret_part) > 8:
+        return f"/webhook/{secret_part[:4]}****{secret_part[-4:]}"
     return path
 
 
+# Prefer explicit config; fall back to common Render vars if present.
+_BASE_URL_KEYS = ("WEBHOOK_BASE_URL", "RENDER_EXTERNAL_URL", "PUBLIC_URL", "SERVICE_URL")
+
+
 def _detect_base_url() -> Optional[str]:
-    # Prefer explicit config; fall back to common Render vars if present.
-    for key in ("WEBHOOK_BASE_URL", "RENDER_EXTERNAL_URL", "PUBLIC_URL", "SERVICE_URL"):
-        v = os.getenv(key, "").strip()
-        if v:
+    for key in _BASE_URL_KEYS:
+        v = os.environ.get(key)
+        if v and (v := v.strip()):
             return v.rstrip("/")
     return None
 
 
+async def _log_bot_identity(bot: Bot) -> None:
+    try:
+        me = await bot.get_me()
+        log.info(f"🤖 Bot identity: @{me.username} (id={me.id}, name={me.first_name})")
+        log.info(f"📱 You should test with: @{me.username}")
+    except Exception as e:
+        log.error(f"❌ Failed to get bot identity: {e}")
+
+
+async def _log_webhook_info(bot: Bot) -> None:
+    try:
+        webhook_info = await bot.get_webhook_info()
+        log.info("🔍 WebhookInfo:")
+        log.info(f"  - URL: {webhook_info.url}")
+        log.info(f"  - Pending updates: {webhook_info.pending_update_count}")
+        log.info(f"  - Max connections: {webhook_info.max_connections}")
+        log.info(f"  - IP address: {webhook_info.ip_address or 'N/A'}")
+        
+        if webhook_info.last_error_date:
+            from datetime import datetime
+            error_dt = datetime.fromtimestamp(webhook_info.last_error_date)
+            log.warning(f"⚠️ Last webhook error: {error_dt.isoformat()}")
+            log.warning(f"⚠️ Error message: {webhook_info.last_error_message}")
+        else:
+            log.info("  - No delivery errors ✅")
+    except Exception as e:
+        log.error(f"❌ Failed to get webhook info: {e}")
+
+
 async def start_webhook_server(
     dp: Dispatcher,
     bot: Bot,
     host: str,
     port: int,
+    db_service: Optional[Any] = None,
 ) -> Tuple[web.AppRunner, Dict[str, Any]]:
     base_url = _detect_base_url()
     
@@ -71,117 +190,122 @@ async def start_webhook_server(
     if not path.startswith("/"):
         path = "/" + path
 
-    @web.middleware
-    async def request_logger(request: web.Request, handler):
-        """Log all incoming requests with timing and safe details."""
-        start_time = time.time()
-        remote_ip = request.headers.get("X-Forwarded-For", request.remote)
-        
-        try:
-            response = await handler(request)
-            latency_ms = int((time.time() - start_time) * 1000)
-            
-            # Log POST requests to webhook endpoints
-            if request.method == "POST" and "/webhook" in request.path:
-                content_length = request.headers.get("Content-Length", "?")
-                log.info(
-                    f"📨 Incoming webhook POST | "
-                    f"path={mask_path(request.path)} "
-                    f"status={response.status} "
-                    f"size={content_length}b "
-                    f"latency={latency_ms}ms "
-                    f"ip={remote_ip}"
-                )
-            
-            return response
-        except Exception as e:
-            latency_ms = int((time.time() - start_time) * 1000)
-            log.error(
-                f"❌ Request failed | "
-                f"method={request.method} "
-                f"path={mask_path(request.path)} "
-                f"latency={latency_ms}ms "
-                f"error={str(e)}"
-            )
-            raise
+    # Probe/metrics paths polled every few seconds: no timing/log bookkeeping
+    probe_paths = frozenset(("/", "/healthz", "/readyz", "/metrics"))
+
+    # Fast path for the guard: the configured route already embeds the secret
+    # (default /webhook/<secret>), so an exact prefix match proves it. Custom
+    # paths without the secret keep header-only auth.
+    secret_path = path if secret in path else None
+
+    def _webhook_authorized(
+        request: web.Request,
+        rpath: str,
+        _secret: str = secret,
+        _secret_bytes: bytes = secret.encode(),
+        _secret_path: Optional[str] = secret_path,
+        _secret_path_dir: str = f"{path}/",
+    ) -> bool:
+        # Check 1: Secret in path (primary security); exact route match first
+        if _secret_path is not None and (rpath == _secret_path or rpath.startswith(_secret_path_dir)):
+            return True
+        if _secret in rpath:
+            return True
+        # Check 2: Legacy /webhook with valid header (fallback)
+        provided_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        # Constant-time compare (encoded: compare_digest rejects non-ASCII str)
+        return bool(provided_header) and hmac.compare_digest(provided_header.encode(), _secret_bytes)
 
     @web.middleware
-    async def secret_guard(request: web.Request, handler):
-        """Dual security: secret path (primary) + header (fallback).
+    async def webhook_middleware(request: web.Request, handler):
+        """Request logging + webhook secret guard in a single middleware layer.
         
-        Security model:
+        Security model (dual: secret path primary, header fallback):
         1. If request path contains secret -> ALLOW (path-based auth)
         2. Else if request to /webhook and has valid header -> ALLOW (header-based auth)
         3. Else -> DENY (unauthorized)
         """
-        # Only guard webhook endpoints
-        if "/webhook" in request.path:
-            # Check 1: Secret in path (primary security)
-            if secret in request.path:
-                # Valid secret path - allow
-                return await handler(request)
-            
-            # Check 2: Legacy /webhook with valid header (fallback)
-            provided_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
-            if provided_header and provided_header == secret:
-                # Valid header - allow
-                return await handler(request)
-            
-            # Neither path nor header valid - deny
-            client_ip = request.headers.get("X-Forwarded-For", request.remote)
-            has_header = bool(request.headers.get("X-Telegram-Bot-Api-Secret-Token"))
+        rpath = request.path
+        if rpath in probe_paths:
+            return await handler(request)
+        
+        # Only guard (and log) webhook endpoints
+        is_webhook = "/webhook" in rpath
+        start_ns = time.monotonic_ns()
+        if is_webhook and not _webhook_authorized(request, rpath):
             log.warning(
-                f"🚫 Unauthorized webhook access | "
-                f"ip={client_ip} "
-                f"path={mask_path(request.path)} "
-                f"has_header={has_header} "
-                f"method={request.method}"
+                "🚫 Unauthorized webhook access | ip=%s path=%s has_header=%s method=%s",
+                request.headers.get("X-Forwarded-For", request.remote),
+                mask_path(rpath),
+                bool(request.headers.get("X-Telegram-Bot-Api-Secret-Token")),
+                request.method,
+            )
+            response = web.Response(status=401, text="Unauthorized")
+        else:
+            try:
+                response = await handler(request)
+            except Exception as e:
+                latency_ms = (time.monotonic_ns() - start_ns) // 1_000_000
+                log.error(
+                    "❌ Request failed | method=%s path=%s latency=%dms error=%s",
+                    request.method,
+                    mask_path(rpath),
+                    latency_ms,
+                    e,
+                )
+                raise
+        
+        # Log POST requests to webhook endpoints
+        if is_webhook and request.method == "POST" and log.isEnabledFor(logging.INFO):
+            log.info(
+                "📨 Incoming webhook POST | path=%s status=%d size=%sb latency=%dms ip=%s",
+                mask_path(rpath),
+                response.status,
+                request.headers.get("Content-Length", "?"),
+                (time.monotonic_ns() - start_ns) // 1_000_000,
+                request.headers.get("X-Forwarded-For", request.remote),
             )
-            return web.Response(status=401, text="Unauthorized")
         
-        return await handler(request)
+        return response
 
     # Set max body size for uploads (10MB default, configurable)
     max_size = int(os.getenv("WEBHOOK_MAX_BODY_SIZE", 10 * 1024 * 1024))
     app = web.Application(
-        middlewares=[request_logger, secret_guard],
+        middlewares=[webhook_middleware],
         client_max_size=max_size
     )
 
     # Health endpoints
+    # Liveness payload is static except for "time": serialize the rest once
+    # (the git lookup used to fork a subprocess on every probe).
+    healthz_prefix = json.dumps({
+        "ok": True,
+        "version": os.getenv("APP_VERSION", "1.0.0"),
+        "commit": _git_commit(),
+    })[:-1] + ', "time": '
+
     async def healthz(request: web.Request) -> web.Response:
         """Liveness probe - always returns 200 OK quickly (no DB/external deps)."""
-        import subprocess
-        try:
-            # Get git commit hash if available
-            commit = subprocess.check_output(
-                ["git", "rev-parse", "--short", "HEAD"],
-                stderr=subprocess.DEVNULL,
-                timeout=1
-            ).decode().strip()
-        except Exception:
-            commit = "unknown"
-        
-        return web.json_response({
-            "ok": True,
-            "version": os.getenv("APP_VERSION", "1.0.0"),
-            "commit": commit,
-            "time": time.time(),
-        }, status=200)
+        return web.Response(
+            body=f"{healthz_prefix}{time.time()!r}}}".encode(),
+            content_type="application/json",
+            status=200,
+        )
+
+    # Process env does not change at runtime: resolve readiness flags once
+    has_bot_token = bool(os.environ.get("TELEGRAM_BOT_TOKEN"))
+    has_kie_key = bool(os.environ.get("KIE_API_KEY"))
 
     async def readyz(request: web.Request) -> web.Response:
         """Readiness probe - checks minimal dependencies with timeout."""
-        import asyncio
-        
         checks = {
-            "bot_token": bool(os.getenv("TELEGRAM_BOT_TOKEN")),
-            "kie_key": bool(os.getenv("KIE_API_KEY")),
+            "bot_token": has_bot_token,
+            "kie_key": has_kie_key,
         }
         
         # Optional DB check with timeout
         db_ok = None
         try:
-            from app.database.service import db_service
             if db_service and db_service.pool:
                 # Quick DB ping with 1s timeout
                 async with asyncio.timeout(1.0):
@@ -199,7 +323,7 @@ async def start_webhook_server(
         # DB is optional (FREE models work without it)
         ready = checks["bot_token"] and checks["kie_key"]
         
-        return web.json_response({
+        return _json_response({
             "ready": ready,
             "checks": checks,
             "note": "DB is optional - FREE models work without it"
@@ -207,19 +331,16 @@ async def start_webhook_server(
 
     async def health(request: web.Request) -> web.Response:
         """Legacy health endpoint - returns current state."""
-        return web.json_response(get_health_state())
+        return _json_response(get_health_state())
     
     async def metrics_endpoint(request: web.Request) -> web.Response:
         """Metrics endpoint for monitoring - returns system metrics."""
         try:
-            from app.utils.metrics import get_system_metrics
-            from app.database.service import db_service
-            
             metrics = await get_system_metrics(db_service)
-            return web.json_response(metrics, status=200)
+            return _json_response(metrics, status=200)
         except Exception as e:
             log.error(f"Failed to get metrics: {e}", exc_info=True)
-            return web.json_response({"error": str(e)}, status=500)
+            return _json_response({"error": str(e)}, status=500)
 
     app.router.add_get("/", health)
     app.router.add_get("/healthz", healthz)
@@ -229,7 +350,7 @@ async def start_webhook_server(
     # Webhook path probe (for manual testing - Telegram uses POST)
     async def webhook_probe(request: web.Request) -> web.Response:
         """Probe endpoint for webhook path (GET allowed for testing)."""
-        return web.json_response({
+        return _json_response({
             "ok": True,
             "path": mask_path(path),
             "method": request.method,
@@ -244,6 +365,27 @@ async def start_webhook_server(
     setup_application(app, dp, bot=bot)
     
     # ==== MEDIA PROXY ROUTE ====
+    # Read once per server start, not per request
+    # Keyed HMAC prototype: copy() per request skips the key schedule
+    media_hmac = hmac.new(
+        os.getenv("MEDIA_PROXY_SECRET", "default_proxy_secret_change_me").encode(),
+        digestmod=hashlib.sha256,
+    )
+    cdn_prefix = f"https://api.telegram.org/file/bot{bot.token}/"
+
+    def _cdn_redirect(request: web.Request, file_path: str, exp_timestamp: int) -> web.Response:
+        """302 to Telegram CDN; clients may reuse it until our cache TTL or the signature expires."""
+        max_age = max(0, min(int(_CACHE_TTL_SECONDS), exp_timestamp - int(time.time())))
+        headers = {
+            "Location": cdn_prefix + file_path,
+            # private: Location embeds the bot token, keep it out of shared caches
+            "Cache-Control": f"private, max-age={max_age}",
+        }
+        # Support range requests for video/audio
+        if request.headers.get("Range"):
+            headers["Accept-Ranges"] = "bytes"
+        return web.Response(status=302, headers=headers)
+
     async def media_proxy(request: web.Request) -> web.Response:
         """Serve Telegram media files with signed URLs (security + expiration)."""
         file_id = request.match_info.get("file_id")
@@ -251,11 +393,14 @@ async def start_webhook_server(
         exp_provided = request.query.get("exp", "")
         
         # Verify signature includes expiration
-        secret = os.getenv("MEDIA_PROXY_SECRET", "default_proxy_secret_change_me")
         payload = f"{file_id}:{exp_provided}"
-        sig_expected = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()[:16]
+        h = media_hmac.copy()
+        h.update(payload.encode())
+        # digest()[:8].hex() == hexdigest()[:16] without formatting all 32 bytes
+        sig_expected = h.digest()[:8].hex()
         
-        if sig_provided != sig_expected:
+        # Constant-time compare; bytes because str operands must be ASCII-only
+        if not hmac.compare_digest(sig_provided.encode(), sig_expected.encode()):
             # Don't log full URL (contains signature)
             remote_ip = request.headers.get("X-Forwarded-For", request.remote)
             log.info(f"Media proxy: Invalid signature | ip={remote_ip}")
@@ -272,44 +417,27 @@ async def start_webhook_server(
             return web.Response(status=401, text="Invalid signature")
         
         # Check cache
-        global _media_proxy_cache
-        now = datetime.now()
+        now = time.monotonic()
         
-        if file_id in _media_proxy_cache:
-            file_path, cached_at = _media_proxy_cache[file_id]
-            if now - cached_at < _CACHE_TTL:
+        entry = _media_proxy_cache.get(file_id)
+        if entry is not None:
+            file_path, cached_at = entry
+            if now - cached_at < _CACHE_TTL_SECONDS:
+                _media_proxy_cache.move_to_end(file_id)
                 # Cache hit - redirect to Telegram CDN
-                file_url = f"https://api.telegram.org/file/bot{bot.token}/{file_path}"
-                
-                # Support range requests for video/audio
-                headers = {"Location": file_url}
-                if request.headers.get("Range"):
-                    headers["Accept-Ranges"] = "bytes"
-                
-                return web.Response(status=302, headers=headers)
+                return _cdn_redirect(request, file_path, exp_timestamp)
             else:
                 # Cache expired
                 del _media_proxy_cache[file_id]
         
         # Resolve file_path via Telegram API
         try:
-            file = await bot.get_file(file_id)
-            file_path = file.file_path
-            
-            # Cache it
-            _media_proxy_cache[file_id] = (file_path, now)
-            
-            # Redirect to Telegram CDN
-            file_url = f"https://api.telegram.org/file/bot{bot.token}/{file_path}"
-            
-            # Support range requests
-            headers = {"Location": file_url}
-            if request.headers.get("Range"):
-                headers["Accept-Ranges"] = "bytes"
+            file_path = await _resolve_file_path(bot, file_id)
             
             # Log without exposing tokens
-            log.info(f"Media proxy: Resolved file_id (len={len(file_id)}) -> path")
-            return web.Response(status=302, headers=headers)
+            log.info("Media proxy: Resolved file_id (len=%d) -> path", len(file_id))
+            # Redirect to Telegram CDN
+            return _cdn_redirect(request, file_path, exp_timestamp)
         
         except Exception as e:
             log.warning(f"Media proxy: Failed to resolve file | error={type(e).__name__}")
@@ -317,9 +445,18 @@ async def start_webhook_server(
     
     app.router.add_get("/media/telegram/{file_id}", media_proxy)
 
-    runner = web.AppRunner(app, access_log=log)
+    # webhook_middleware already logs webhook traffic (with the secret path
+    # masked); aiohttp's access log would format a second record per request.
+    # runner.setup() freezes the app/router before the site starts.
+    runner = web.AppRunner(app, access_log=None)
     await runner.setup()
-    site = web.TCPSite(runner, host=host, port=port)
+    # Build the outbound ClientSession/connector now rather than inside the
+    # first set_webhook call
+    session = getattr(bot, "session", None)
+    if isinstance(session, AiohttpSession):
+        await session.create_session()
+    # Larger accept backlog absorbs Telegram's burst redelivery after downtime
+    site = web.TCPSite(runner, host=host, port=port, backlog=2048)
     await site.start()
 
     info: Dict[str, Any] = {
@@ -337,6 +474,11 @@ async def start_webhook_server(
     log.info(f"  Full webhook URL: {(base_url.rstrip('/') + mask_path(path)) if base_url else 'MISSING'}")
     log.info(f"  Secret token: {'configured ✅' if secret else 'NOT SET ⚠️'}")
     log.info(f"  Security: path-based + header fallback")
+    # Secret/signature hashing should run on OpenSSL's (SHA-NI capable) SHA-256
+    if hashlib.sha256.__module__ != "_hashlib":
+        log.warning("⚠️ hashlib is not OpenSSL-backed: media proxy signing uses the slow builtin SHA-256")
+    else:
+        log.info("  Crypto: %s", ssl.OPENSSL_VERSION)
 
     if not base_url:
         log.warning("⚠️⚠️⚠️ WEBHOOK_BASE_URL NOT SET ⚠️⚠️⚠️")
@@ -357,31 +499,9 @@ async def start_webhook_server(
                 )
                 log.info("✅ Webhook registered successfully: %s", info["webhook_url"])
                 
-                # Startup diagnostics: Bot identity + Webhook health
-                try:
-                    me = await bot.get_me()
-                    log.info(f"🤖 Bot identity: @{me.username} (id={me.id}, name={me.first_name})")
-                    log.info(f"📱 You should test with: @{me.username}")
-                except Exception as e:
-                    log.error(f"❌ Failed to get bot identity: {e}")
-                
-                try:
-                    webhook_info = await bot.get_webhook_info()
-                    log.info("🔍 WebhookInfo:")
-                    log.info(f"  - URL: {webhook_info.url}")
-                    log.info(f"  - Pending updates: {webhook_info.pending_update_count}")
-                    log.info(f"  - Max connections: {webhook_info.max_connections}")
-                    log.info(f"  - IP address: {webhook_info.ip_address or 'N/A'}")
-                    
-                    if webhook_info.last_error_date:
-                        from datetime import datetime
-                        error_dt = datetime.fromtimestamp(webhook_info.last_error_date)
-                        log.warning(f"⚠️ Last webhook error: {error_dt.isoformat()}")
-                        log.warning(f"⚠️ Error message: {webhook_info.last_error_message}")
-                    else:
-                        log.info("  - No delivery errors ✅")
-                except Exception as e:
-                    log.error(f"❌ Failed to get webhook info: {e}")
+                # Startup diagnostics: Bot identity + Webhook health (independent
+                # round-trips, run concurrently; each logs its own failure)
+                await asyncio.gather(_log_bot_identity(bot), _log_webhook_info(bot))
                 
                 break
             except Exception as e:
@@ -406,8 +526,8 @@ async def stop_webhook_server(runner: Optional[web.AppRunner]) -> None:
         return
     try:
         # Graceful shutdown: clear in-memory caches
-        global _media_proxy_cache
         _media_proxy_cache.clear()
+        _media_proxy_inflight.clear()
         log.info("Cleared media proxy cache")
         
         # Clear idempotency and locks (if they're in-memory)
@@ -1,15 +1,24 @@
-"""Wizard flow for guided model input."""
+"""Wizard flow for guided model input.
+
+Messages are HTML; parse_mode comes from the Bot's DefaultBotProperties (main_render).
+"""
 import logging
 import hmac
 import hashlib
 import os
+import re
 from typing import Dict, List, Optional, Any
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
+from app.payments.charges import get_charge_manager
+from app.payments.integration import generate_with_payment
+from app.ui import tone_ru
+from app.ui.catalog import get_model
 from app.ui.input_spec import get_input_spec, InputType
+from app.ui.model_profile import build_profile
 from bot.flows.wizard_presets import (
     get_presets_for_format,
     get_preset_by_id,
@@ -18,6 +27,9 @@ from bot.flows.wizard_presets import (
 
 logger = logging.getLogger(__name__)
 router = Router(name="wizard")
+# Router-level gate: every wizard callback is "wizard:*", so other callbacks
+# skip this router's handler filters after a single prefix check.
+router.callback_query.filter(F.data.startswith("wizard:"))
 
 
 class WizardState(StatesGroup):
@@ -26,16 +38,51 @@ class WizardState(StatesGroup):
     confirming = State()
 
 
+# Media proxy config is fixed for the process lifetime: read env once at import
+_MEDIA_PROXY_SECRET = os.environ.get("MEDIA_PROXY_SECRET", "default_proxy_secret_change_me").encode()
+_PUBLIC_BASE_URL = os.environ.get(
+    "PUBLIC_BASE_URL", os.environ.get("WEBHOOK_BASE_URL", "https://unknown.render.com")
+).rstrip("/")
+
+
+# Keyed once; copy() per signature skips re-deriving the ipad/opad key blocks
+_MEDIA_PROXY_HMAC = hmac.new(_MEDIA_PROXY_SECRET, digestmod=hashlib.sha256)
+
+
 def _sign_file_id(file_id: str) -> str:
     """Sign file ID for secure media proxy."""
-    secret = os.getenv("MEDIA_PROXY_SECRET", "default_proxy_secret_change_me")
-    signature = hmac.new(secret.encode(), file_id.encode(), hashlib.sha256).hexdigest()[:16]
-    return signature
+    h = _MEDIA_PROXY_HMAC.copy()
+    h.update(file_id.encode())
+    # digest()[:8].hex() == hexdigest()[:16] without formatting all 32 bytes
+    return h.digest()[:8].hex()
 
 
 def _get_public_base_url() -> str:
     """Get PUBLIC_BASE_URL for media proxy."""
-    return os.getenv("PUBLIC_BASE_URL", os.getenv("WEBHOOK_BASE_URL", "https://unknown.render.com")).rstrip("/")
+    return _PUBLIC_BASE_URL
+
+
+# Field prompt emoji by input type
+_FIELD_EMOJI = {
+    InputType.TEXT: "✍️",
+    InputType.IMAGE_URL: "🖼",
+    InputType.IMAGE_FILE: "🖼",
+    InputType.VIDEO_URL: "🎬",
+    InputType.VIDEO_FILE: "🎬",
+    InputType.AUDIO_URL: "🎙",
+    InputType.AUDIO_FILE: "🎙",
+    InputType.NUMBER: "🔢",
+    InputType.ENUM: "📋",
+    InputType.BOOLEAN: "✅",
+}
+
+
+# Static confirmation keyboard (built once; model-specific keyboards stay per call)
+_CONFIRM_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="✅ Подтвердить", callback_data="wizard:confirm")],
+    [InlineKeyboardButton(text="✏️ Изменить", callback_data="wizard:edit")],
+    [InlineKeyboardButton(text="🏠 В меню", callback_data="menu:main")],
+])
 
 
 # Wizard start handler (callback: wizard:start:<model_id>)
@@ -44,7 +91,6 @@ async def wizard_start_handler(callback: CallbackQuery, state: FSMContext) -> No
     """Start wizard from callback."""
     model_id = callback.data.split(":", 2)[2]
     
-    from app.ui.catalog import get_model
     model = get_model(model_id)
     
     if not model:
@@ -60,9 +106,6 @@ async def wizard_example_handler(callback: CallbackQuery, state: FSMContext) ->
     """Start wizard with example prompt filled in."""
     model_id = callback.data.split(":", 2)[2]
     
-    from app.ui.catalog import get_model
-    from app.ui.model_profile import build_profile
-    
     model = get_model(model_id)
     if not model:
         await callback.answer("❌ Модель не найдена", show_alert=True)
@@ -104,8 +147,7 @@ async def start_wizard(
         # No inputs needed, go straight to generation
         await callback.message.edit_text(
             f"🚀 <b>{display_name}</b>\n\n"
-            "Запускаю генерацию...",
-            parse_mode="HTML"
+            "Запускаю генерацию..."
         )
         
         # Save state and trigger generation
@@ -153,7 +195,6 @@ async def show_wizard_overview(message: Message, state: FSMContext, spec, model_
         spec: InputSpec object
         model_config: Model configuration
     """
-    from app.ui import tone_ru
     from app.ui.profile import build_profile
     
     model_id = model_config.get("model_id", "unknown")
@@ -216,9 +257,9 @@ async def show_wizard_overview(message: Message, state: FSMContext, spec, model_
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     
     try:
-        await message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+        await message.edit_text(text, reply_markup=kb)
     except Exception:
-        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+        await message.answer(text, reply_markup=kb)
 
 
 @router.callback_query(F.data == "wizard:start_collecting")
@@ -230,11 +271,11 @@ async def wizard_start_collecting_handler(callback: CallbackQuery, state: FSMCon
     spec = data.get("wizard_spec")
     
     if not spec or not spec.fields:
-        await callback.message.edit_text("❌ Ошибка: спецификация не найдена", parse_mode="HTML")
+        await callback.message.edit_text("❌ Ошибка: спецификация не найдена")
         return
     
     # Show first field
-    await show_field_input(callback.message, state, spec.fields[0])
+    await show_field_input(callback.message, state, spec.fields[0], data)
 
 
 @router.callback_query(F.data.startswith("wizard:presets:"))
@@ -244,11 +285,10 @@ async def wizard_show_presets(callback: CallbackQuery, state: FSMContext) -> Non
     
     model_id = callback.data.split(":", 2)[2]
     
-    from app.ui.catalog import get_model
     model = get_model(model_id)
     
     if not model:
-        await callback.message.edit_text("❌ Модель не найдена", parse_mode="HTML")
+        await callback.message.edit_text("❌ Модель не найдена")
         return
     
     # Detect format
@@ -283,7 +323,7 @@ async def wizard_show_presets(callback: CallbackQuery, state: FSMContext) -> Non
     )])
     
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
-    await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+    await callback.message.edit_text(text, reply_markup=kb)
 
 
 @router.callback_query(F.data.startswith("wizard:use_preset:"))
@@ -303,7 +343,7 @@ async def wizard_use_preset(callback: CallbackQuery, state: FSMContext) -> None:
     spec = data.get("wizard_spec")
     
     if not spec:
-        await callback.message.edit_text("❌ Ошибка: спецификация не найдена", parse_mode="HTML")
+        await callback.message.edit_text("❌ Ошибка: спецификация не найдена")
         return
     
     # Fill first text field with preset prompt
@@ -314,15 +354,13 @@ async def wizard_use_preset(callback: CallbackQuery, state: FSMContext) -> None:
         if field.type == InputType.TEXT and field.name in ["prompt", "text", "description"]:
             wizard_inputs[field.name] = preset_prompt
             break
-    
-    await state.update_data(wizard_inputs=wizard_inputs)
+    data["wizard_inputs"] = wizard_inputs
     
     # Show confirmation
     await callback.message.edit_text(
         f"✅ Применён пресет:\\n<b>{preset['name']}</b>\\n\\n"
         f"<i>{preset_prompt}</i>\\n\\n"
-        f"Продолжаем сбор остальных параметров...",
-        parse_mode="HTML"
+        f"Продолжаем сбор остальных параметров..."
     )
     
     # Continue with next field or confirmation
@@ -334,15 +372,22 @@ async def wizard_use_preset(callback: CallbackQuery, state: FSMContext) -> None:
             break
     
     if current_idx < len(spec.fields):
-        await state.update_data(wizard_current_field_index=current_idx)
-        await show_field_input(callback.message, state, spec.fields[current_idx])
+        data["wizard_current_field_index"] = current_idx
+        await state.set_data(data)
+        await show_field_input(callback.message, state, spec.fields[current_idx], data)
     else:
+        await state.set_data(data)
         # All fields filled, show confirmation
         from bot.handlers.flow import wizard_show_confirmation
         await wizard_show_confirmation(callback, state)
 
 
-async def show_field_input(message: Message, state: FSMContext, field) -> None:
+async def show_field_input(
+    message: Message,
+    state: FSMContext,
+    field,
+    data: Optional[Dict[str, Any]] = None,
+) -> None:
     """
     Show input prompt for a field.
     
@@ -350,8 +395,10 @@ async def show_field_input(message: Message, state: FSMContext, field) -> None:
         message: Message to edit
         state: FSM state
         field: InputField object
+        data: FSM data the caller already holds (read from state if None)
     """
-    data = await state.get_data()
+    if data is None:
+        data = await state.get_data()
     model_config = data.get("model_config", {})
     display_name = model_config.get("display_name", "Модель")
     spec = data.get("wizard_spec")
@@ -362,49 +409,38 @@ async def show_field_input(message: Message, state: FSMContext, field) -> None:
     step_num = current_idx + 1
     
     # Build field description
-    field_emoji = {
-        InputType.TEXT: "✍️",
-        InputType.IMAGE_URL: "🖼",
-        InputType.IMAGE_FILE: "🖼",
-        InputType.VIDEO_URL: "🎬",
-        InputType.VIDEO_FILE: "🎬",
-        InputType.AUDIO_URL: "🎙",
-        InputType.AUDIO_FILE: "🎙",
-        InputType.NUMBER: "🔢",
-        InputType.ENUM: "📋",
-        InputType.BOOLEAN: "✅",
-    }.get(field.type, "📝")
+    field_emoji = _FIELD_EMOJI.get(field.type, "📝")
     
     # Educational header
-    text = (
-        f"🧠 <b>{display_name}</b>  •  Шаг {step_num}/{total_fields}\n\n"
-        f"{field_emoji} <b>{field.description or field.name}</b>\n\n"
-    )
+    parts = [
+        f"🧠 <b>{display_name}</b>  •  Шаг {step_num}/{total_fields}\n\n",
+        f"{field_emoji} <b>{field.description or field.name}</b>\n\n",
+    ]
     
     if field.example:
-        text += f"💡 <b>Пример:</b> <i>{field.example}</i>\n\n"
+        parts.append(f"💡 <b>Пример:</b> <i>{field.example}</i>\n\n")
     
     if field.enum_values:
-        text += "<b>Варианты:</b>\n"
-        for val in field.enum_values:
-            text += f"• {val}\n"
-        text += "\n"
+        parts.append("<b>Варианты:</b>\n")
+        parts.extend(f"• {val}\n" for val in field.enum_values)
+        parts.append("\n")
     
     if field.type == InputType.NUMBER:
         if field.min_value is not None and field.max_value is not None:
-            text += f"📊 Диапазон: {field.min_value}–{field.max_value}\n\n"
+            parts.append(f"📊 Диапазон: {field.min_value}–{field.max_value}\n\n")
         if field.default is not None:
-            text += f"По умолчанию: {field.default}\n\n"
+            parts.append(f"По умолчанию: {field.default}\n\n")
     
     # Format-specific hints (улучшенные - "файл ИЛИ ссылка")
     if field.type in [InputType.IMAGE_FILE, InputType.VIDEO_FILE, InputType.AUDIO_FILE]:
-        text += "📎 Загрузите файл из галереи\n\n"
+        parts.append("📎 Загрузите файл из галереи\n\n")
     elif field.type in [InputType.IMAGE_URL, InputType.VIDEO_URL, InputType.AUDIO_URL]:
-        text += "📎 Загрузите файл ИЛИ отправьте ссылку\n\n"
+        parts.append("📎 Загрузите файл ИЛИ отправьте ссылку\n\n")
     elif field.type == InputType.TEXT:
-        text += "✍️ Опишите что хотите получить\n\n"
+        parts.append("✍️ Опишите что хотите получить\n\n")
     
-    text += "👇 Отправь ответ:"
+    parts.append("👇 Отправь ответ:")
+    text = "".join(parts)
     
     # Build keyboard
     buttons = []
@@ -428,10 +464,17 @@ async def show_field_input(message: Message, state: FSMContext, field) -> None:
     
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     
+    # After typed input/uploads `message` is the user's own message, which the
+    # bot can never edit: answer directly instead of paying a failing edit RPC.
+    sender = message.from_user
+    if sender is not None and sender.is_bot is False:
+        await message.answer(text, reply_markup=kb)
+        return
+    
     try:
-        await message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+        await message.edit_text(text, reply_markup=kb)
     except Exception:
-        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+        await message.answer(text, reply_markup=kb)
 
 
 @router.callback_query(F.data == "wizard:skip", WizardState.collecting_input)
@@ -444,7 +487,7 @@ async def wizard_skip_field(callback: CallbackQuery, state: FSMContext) -> None:
     current_index = data.get("wizard_current_field_index", 0)
     
     if current_index >= len(spec.fields):
-        await wizard_show_confirmation(callback, state)
+        await wizard_show_confirmation(callback, state, data)
         return
     
     current_field = spec.fields[current_index]
@@ -455,12 +498,13 @@ async def wizard_skip_field(callback: CallbackQuery, state: FSMContext) -> None:
     
     # Move to next field
     next_index = current_index + 1
-    await state.update_data(wizard_current_field_index=next_index)
+    data["wizard_current_field_index"] = next_index
+    await state.set_data(data)
     
     if next_index >= len(spec.fields):
-        await wizard_show_confirmation(callback, state)
+        await wizard_show_confirmation(callback, state, data)
     else:
-        await show_field_input(callback.message, state, spec.fields[next_index])
+        await show_field_input(callback.message, state, spec.fields[next_index], data)
 
 
 @router.callback_query(F.data == "wizard:use_default", WizardState.collecting_input)
@@ -487,15 +531,14 @@ async def wizard_use_default(callback: CallbackQuery, state: FSMContext) -> None
     
     # Move to next field
     next_index = current_index + 1
-    await state.update_data(
-        wizard_inputs=inputs,
-        wizard_current_field_index=next_index
-    )
+    data["wizard_inputs"] = inputs
+    data["wizard_current_field_index"] = next_index
+    await state.set_data(data)
     
     if next_index >= len(spec.fields):
-        await wizard_show_confirmation(callback, state)
+        await wizard_show_confirmation(callback, state, data)
     else:
-        await show_field_input(callback.message, state, spec.fields[next_index])
+        await show_field_input(callback.message, state, spec.fields[next_index], data)
 
 
 @router.callback_query(F.data == "wizard:back", WizardState.collecting_input)
@@ -519,8 +562,9 @@ async def wizard_go_back(callback: CallbackQuery, state: FSMContext) -> None:
     # Go to previous field
     spec = data.get("wizard_spec")
     prev_index = current_index - 1
-    await state.update_data(wizard_current_field_index=prev_index)
-    await show_field_input(callback.message, state, spec.fields[prev_index])
+    data["wizard_current_field_index"] = prev_index
+    await state.set_data(data)
+    await show_field_input(callback.message, state, spec.fields[prev_index], data)
 
 
 @router.message(WizardState.collecting_input)
@@ -577,15 +621,13 @@ async def wizard_process_input(message: Message, state: FSMContext) -> None:
                 # Acknowledge upload
                 await message.answer(
                     f"✅ <b>Файл принят!</b>\n\n"
-                    f"📎 {current_field.description or current_field.name}",
-                    parse_mode="HTML"
+                    f"📎 {current_field.description or current_field.name}"
                 )
             else:
                 # Fallback: no BASE_URL configured, ask for URL
                 await message.answer(
                     f"⚠️ <b>Загрузка файлов недоступна</b>\n\n"
-                    f"Пришлите прямую ссылку на {current_field.description or current_field.name}:",
-                    parse_mode="HTML"
+                    f"Пришлите прямую ссылку на {current_field.description or current_field.name}:"
                 )
                 return
         elif message.text and message.text.startswith(("http://", "https://")):
@@ -593,15 +635,13 @@ async def wizard_process_input(message: Message, state: FSMContext) -> None:
             inputs[current_field.name] = message.text
             await message.answer(
                 f"✅ <b>Ссылка принята!</b>\n\n"
-                f"🔗 {current_field.description or current_field.name}",
-                parse_mode="HTML"
+                f"🔗 {current_field.description or current_field.name}"
             )
         else:
             await message.answer(
                 f"❌ <b>Неверный формат</b>\n\n"
                 f"Ожидается: файл ИЛИ ссылка\n\n"
-                f"📎 Загрузите файл или отправьте http(s) URL",
-                parse_mode="HTML"
+                f"📎 Загрузите файл или отправьте http(s) URL"
             )
             return
     else:
@@ -609,7 +649,7 @@ async def wizard_process_input(message: Message, state: FSMContext) -> None:
         user_input = message.text
         
         if not user_input:
-            await message.answer("❌ Пустой ввод. Попробуйте снова.", parse_mode="HTML")
+            await message.answer("❌ Пустой ввод. Попробуйте снова.")
             return
         
         # Validate input
@@ -618,8 +658,7 @@ async def wizard_process_input(message: Message, state: FSMContext) -> None:
         if not is_valid:
             await message.answer(
                 f"❌ <b>Ошибка валидации:</b>\n{error}\n\n"
-                "Попробуйте снова:",
-                parse_mode="HTML"
+                "Попробуйте снова:"
             )
             return
         
@@ -628,20 +667,24 @@ async def wizard_process_input(message: Message, state: FSMContext) -> None:
     
     # Move to next field
     next_index = current_index + 1
-    await state.update_data(
-        wizard_inputs=inputs,
-        wizard_current_field_index=next_index
-    )
+    data["wizard_inputs"] = inputs
+    data["wizard_current_field_index"] = next_index
+    await state.set_data(data)
     
     if next_index >= len(spec.fields):
-        await wizard_show_confirmation(message, state)
+        await wizard_show_confirmation(message, state, data)
     else:
-        await show_field_input(message, state, spec.fields[next_index])
+        await show_field_input(message, state, spec.fields[next_index], data)
 
 
-async def wizard_show_confirmation(message_or_callback, state: FSMContext) -> None:
-    """Show confirmation screen with summary."""
-    data = await state.get_data()
+async def wizard_show_confirmation(
+    message_or_callback,
+    state: FSMContext,
+    data: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Show confirmation screen with summary (data: FSM data if already read)."""
+    if data is None:
+        data = await state.get_data()
     model_config = data.get("model_config", {})
     inputs = data.get("wizard_inputs", {})
     
@@ -654,38 +697,28 @@ async def wizard_show_confirmation(message_or_callback, state: FSMContext) -> No
     is_free = pricing.get("is_free", False)
     
     # Build summary
-    text = (
-        f"✅ <b>Подтверждение запуска</b>\n\n"
-        f"🎯 <b>Модель:</b> {display_name}\n\n"
-        f"<b>Параметры:</b>\n"
-    )
-    
-    for field_name, value in inputs.items():
-        text += f"• {field_name}: {value}\n"
-    
-    text += "\n"
+    parts = [
+        "✅ <b>Подтверждение запуска</b>\n\n",
+        f"🎯 <b>Модель:</b> {display_name}\n\n",
+        "<b>Параметры:</b>\n",
+    ]
+    parts.extend(f"• {field_name}: {value}\n" for field_name, value in inputs.items())
+    parts.append("\n")
     
     if is_free:
-        text += "🆓 <b>Бесплатно</b>\n\n"
+        parts.append("🆓 <b>Бесплатно</b>\n\n")
     else:
-        text += f"💰 <b>Стоимость:</b> {price_rub:.2f} ₽\n\n"
-    
-    text += "🚀 Всё готово к запуску!"
+        parts.append(f"💰 <b>Стоимость:</b> {price_rub:.2f} ₽\n\n")
     
-    buttons = [
-        [InlineKeyboardButton(text="✅ Подтвердить", callback_data="wizard:confirm")],
-        [InlineKeyboardButton(text="✏️ Изменить", callback_data="wizard:edit")],
-        [InlineKeyboardButton(text="🏠 В меню", callback_data="menu:main")],
-    ]
-    
-    kb = InlineKeyboardMarkup(inline_keyboard=buttons)
+    parts.append("🚀 Всё готово к запуску!")
+    text = "".join(parts)
     
     await state.set_state(WizardState.confirming)
     
     if isinstance(message_or_callback, Message):
-        await message_or_callback.answer(text, reply_markup=kb, parse_mode="HTML")
+        await message_or_callback.answer(text, reply_markup=_CONFIRM_KB)
     else:
-        await message_or_callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+        await message_or_callback.message.edit_text(text, reply_markup=_CONFIRM_KB)
 
 
 @router.callback_query(F.data == "wizard:confirm", WizardState.confirming)
@@ -703,36 +736,21 @@ async def wizard_confirm_and_generate(callback: CallbackQuery, state: FSMContext
     # Show "starting..." message
     await callback.message.edit_text(
         f"🚀 <b>{display_name}</b>\n\n"
-        "Запускаю генерацию...",
-        parse_mode="HTML"
+        "Запускаю генерацию..."
     )
     
-    # Build payload from inputs
-    payload = dict(inputs)  # Copy wizard inputs
-    
-    # Add defaults from schema if missing
-    schema = model_config.get("input_schema", {})
-    properties = schema.get("properties", {})
-    
-    for field_name, field_spec in properties.items():
-        if field_name not in payload and "default" in field_spec:
-            payload[field_name] = field_spec["default"]
-    
-    # Save generation context
-    await state.update_data(
-        model_id=model_id,
-        payload=payload,
-        is_free_selected=False,  # Will be determined by pricing
-    )
+    # Build payload: schema defaults first, wizard inputs override
+    properties = model_config.get("input_schema", {}).get("properties", {})
+    payload = {
+        **{name: spec["default"] for name, spec in properties.items() if "default" in spec},
+        **inputs,
+    }
     
-    # Clear wizard state
+    # Clear wizard state (generation context travels as arguments below)
     await state.clear()
     
     # Trigger generation via payment integration
     # Note: payload arg kept for backward compat in integration.py
-    from app.payments.integration import generate_with_payment
-    from app.payments.charges import get_charge_manager
-    
     user_id = callback.from_user.id
     chat_id = callback.message.chat.id
     
@@ -767,7 +785,7 @@ async def wizard_confirm_and_generate(callback: CallbackQuery, state: FSMContext
             kb = InlineKeyboardMarkup(inline_keyboard=buttons)
             
             # Send text message
-            await callback.message.answer(success_text, reply_markup=kb, parse_mode="HTML")
+            await callback.message.answer(success_text, reply_markup=kb)
             
             # Send media result
             if output_url:
@@ -783,7 +801,7 @@ async def wizard_confirm_and_generate(callback: CallbackQuery, state: FSMContext
                     else:
                         await callback.message.answer(f"📎 Результат: {output_url}")
                 except Exception as e:
-                    logger.error(f"Failed to send media result: {e}")
+                    logger.error("Failed to send media result: %s", e)
                     await callback.message.answer(f"📎 Результат: {output_url}")
         else:
             # Error
@@ -809,10 +827,10 @@ async def wizard_confirm_and_generate(callback: CallbackQuery, state: FSMContext
             ]
             kb = InlineKeyboardMarkup(inline_keyboard=buttons)
             
-            await callback.message.answer(error_text, reply_markup=kb, parse_mode="HTML")
+            await callback.message.answer(error_text, reply_markup=kb)
             
     except Exception as e:
-        logger.error(f"Generation failed: {e}", exc_info=True)
+        logger.error("Generation failed: %s", e, exc_info=True)
         
         error_text = (
             f"❌ <b>Ошибка генерации</b>\n\n"
@@ -830,7 +848,25 @@ async def wizard_confirm_and_generate(callback: CallbackQuery, state: FSMContext
         ]
         kb = InlineKeyboardMarkup(inline_keyboard=buttons)
         
-        await callback.message.answer(error_text, reply_markup=kb, parse_mode="HTML")
+        await callback.message.answer(error_text, reply_markup=kb)
+
+
+# Error keyword classes for _sanitize_error_for_user (checked in this order)
+_ERROR_KEYWORDS = re.compile(
+    r"(?P<missing>required|field)"
+    r"|(?P<invalid>invalid|validation)"
+    r"|(?P<timeout>timeout|timed out)"
+    r"|(?P<rate_limit>rate limit|too many)"
+    r"|(?P<balance>balance|insufficient)",
+    re.IGNORECASE,
+)
+_ERROR_MESSAGES = (
+    ("missing", "Не хватает обязательного поля. Пожалуйста, заполните все данные."),
+    ("invalid", "Некорректные данные. Проверьте введённые значения."),
+    ("timeout", "Превышено время ожидания. Попробуйте ещё раз."),
+    ("rate_limit", "Слишком много запросов. Подождите немного и попробуйте снова."),
+    ("balance", "Недостаточно средств. Пополните баланс."),
+)
 
 
 def _sanitize_error_for_user(error_msg: str, error_code: str) -> str:
@@ -844,22 +880,11 @@ def _sanitize_error_for_user(error_msg: str, error_code: str) -> str:
     Returns:
         User-friendly error message
     """
-    error_lower = error_msg.lower()
-    
-    if "required" in error_lower or "field" in error_lower:
-        return "Не хватает обязательного поля. Пожалуйста, заполните все данные."
-    
-    if "invalid" in error_lower or "validation" in error_lower:
-        return "Некорректные данные. Проверьте введённые значения."
-    
-    if "timeout" in error_lower or "timed out" in error_lower:
-        return "Превышено время ожидания. Попробуйте ещё раз."
-    
-    if "rate limit" in error_lower or "too many" in error_lower:
-        return "Слишком много запросов. Подождите немного и попробуйте снова."
-    
-    if "balance" in error_lower or "insufficient" in error_lower:
-        return "Недостаточно средств. Пополните баланс."
+    # One scan collects every keyword class; the first class in priority order wins
+    found = {m.lastgroup for m in _ERROR_KEYWORDS.finditer(error_msg)}
+    for group, user_msg in _ERROR_MESSAGES:
+        if group in found:
+            return user_msg
     
     # Generic fallback
     return "Произошла ошибка. Попробуйте изменить параметры или обратитесь в поддержку."
@@ -874,6 +899,7 @@ async def wizard_edit_inputs(callback: CallbackQuery, state: FSMContext) -> None
     spec = data.get("wizard_spec")
     
     # Go back to first field
-    await state.update_data(wizard_current_field_index=0)
+    data["wizard_current_field_index"] = 0
+    await state.set_data(data)
     await state.set_state(WizardState.collecting_input)
-    await show_field_input(callback.message, state, spec.fields[0])
+    await show_field_input(callback.message, state, spec.fields[0], data)
@@ -4,53 +4,52 @@ Must be included AFTER specific routers (flow, marketing, etc).
 """
 
 from aiogram import Router
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.types import CallbackQuery, InaccessibleMessage, InlineKeyboardButton, InlineKeyboardMarkup
 import logging
 
+from app.ui import tone_ru
+
 logger = logging.getLogger(__name__)
 router = Router(name="callback_fallback")
 
 
 
-def _fallback_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")],
-            [InlineKeyboardButton(text="ℹ️ Помощь", callback_data="menu:help")],
-        ]
-    )
+# Static keyboard: built once at import, not per fallback reply
+_FALLBACK_MENU = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")],
+        [InlineKeyboardButton(text="ℹ️ Помощь", callback_data="menu:help")],
+    ]
+)
 
 
 @router.callback_query()
 async def handle_unknown_callback(callback: CallbackQuery):
     """Improved fallback: auto-redirect to main menu instead of asking /start."""
-    from app.ui import tone_ru
-    
-    data = callback.data or ""
-    uid = callback.from_user.id if callback.from_user else "-"
-    logger.warning(f"E_CALLBACK unknown callback | uid={uid} data={data[:200]}")
+    if logger.isEnabledFor(logging.WARNING):
+        logger.warning(
+            "E_CALLBACK unknown callback | uid=%s data=%s",
+            callback.from_user.id if callback.from_user else "-",
+            (callback.data or "")[:200],
+        )
     
     try:
-        await callback.answer(tone_ru.MSG_BUTTON_OUTDATED.replace("<b>", "").replace("</b>", "").replace("\n\n", " "), show_alert=False)
+        await callback.answer(tone_ru.MSG_BUTTON_OUTDATED_PLAIN, show_alert=False)
     except Exception:
         pass
 
-    # Auto-redirect to main menu (no /start needed)
+    # Auto-redirect to main menu (no /start needed). Telegram reports messages
+    # it no longer lets us touch as InaccessibleMessage: every edit would 400.
     msg = callback.message
-    if not msg:
+    if not msg or isinstance(msg, InaccessibleMessage):
         return
     
     text = tone_ru.MSG_BUTTON_OUTDATED
     
     try:
-        await msg.edit_text(text, reply_markup=_fallback_menu(), parse_mode="HTML")
-    except Exception:
-        try:
-            await msg.answer(text, reply_markup=_fallback_menu(), parse_mode="HTML")
-        except Exception:
-            pass
+        await msg.edit_text(text, reply_markup=_FALLBACK_MENU)
     except Exception:
         try:
-            await msg.answer(text, reply_markup=_fallback_menu())
+            await msg.answer(text, reply_markup=_FALLBACK_MENU)
         except Exception:
             pass
@@ -3,6 +3,7 @@ Admin diagnostics command with comprehensive webhook info.
 """
 import os
 from datetime import datetime
+from typing import Optional
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
@@ -11,12 +12,43 @@ from app.utils.runtime_state import runtime_state
 
 router = Router(name="diag")
 
+# Parsed once at import. 0 = no restriction (as before); an unparsable value
+# denies everyone, matching the old per-call int() failure.
+try:
+    _ADMIN_ID: Optional[int] = int(os.getenv("ADMIN_ID", "0") or 0)
+except ValueError:
+    _ADMIN_ID = None
+
+# Diagnostic message layout, filled per call with format_map
+_DIAG_TEMPLATE = (
+    "🩺 <b>Диагностика бота</b>\n\n"
+    "<b>🤖 Bot State:</b>\n"
+    "  • Mode: {bot_mode}\n"
+    "  • Storage: {storage_mode}\n"
+    "  • Instance: {instance_id}\n"
+    "  • Lock: {lock_status}\n"
+    "  • Started: {last_start_time}\n\n"
+    "<b>🌐 Webhook Info:</b>\n"
+    "  • URL: <code>{url}</code>\n"
+    "  • Pending updates: {pending}\n"
+    "  • Max connections: {max_connections}\n"
+    "  • IP address: {ip_address}\n"
+    "  • Custom cert: {custom_cert}\n\n"
+    "{error_block}"
+    "{status_line}"
+)
+_DIAG_ERROR_BLOCK = (
+    "<b>⚠️ Last Error:</b>\n"
+    "  • Date: {date}\n"
+    "  • Message: <code>{message}</code>\n\n"
+)
+_DIAG_NO_ERRORS = "<b>✅ No webhook errors</b>\n\n"
+
 
 @router.message(Command("diag"))
 async def cmd_diag(message: Message) -> None:
     """Comprehensive diagnostics for admin (bot state + webhook health)."""
-    admin_id = int(os.getenv("ADMIN_ID", "0"))
-    if admin_id and message.from_user and message.from_user.id != admin_id:
+    if _ADMIN_ID is None or (_ADMIN_ID and message.from_user and message.from_user.id != _ADMIN_ID):
         await message.answer("⛔ Доступ запрещён")
         return
 
@@ -38,39 +70,38 @@ async def cmd_diag(message: Message) -> None:
         except:
             last_error_str = str(webhook_info.last_error_date)
     
-    # Build diagnostic message
-    text = (
-        "🩺 <b>Диагностика бота</b>\n\n"
-        "<b>🤖 Bot State:</b>\n"
-        f"  • Mode: {bot_mode}\n"
-        f"  • Storage: {storage_mode}\n"
-        f"  • Instance: {instance_id}\n"
-        f"  • Lock: {lock_status}\n"
-        f"  • Started: {last_start_time}\n\n"
-        "<b>🌐 Webhook Info:</b>\n"
-        f"  • URL: <code>{webhook_info.url or 'NOT SET'}</code>\n"
-        f"  • Pending updates: {webhook_info.pending_update_count}\n"
-        f"  • Max connections: {webhook_info.max_connections or 'default'}\n"
-        f"  • IP address: {webhook_info.ip_address or 'N/A'}\n"
-        f"  • Custom cert: {'✅' if webhook_info.has_custom_certificate else '❌'}\n\n"
-    )
-    
     # Add error info if present
     if webhook_info.last_error_date or webhook_info.last_error_message:
-        text += (
-            "<b>⚠️ Last Error:</b>\n"
-            f"  • Date: {last_error_str}\n"
-            f"  • Message: <code>{webhook_info.last_error_message or 'N/A'}</code>\n\n"
+        error_block = _DIAG_ERROR_BLOCK.format(
+            date=last_error_str,
+            message=webhook_info.last_error_message or "N/A",
         )
     else:
-        text += "<b>✅ No webhook errors</b>\n\n"
+        error_block = _DIAG_NO_ERRORS
     
     # Health status
     if webhook_info.url and webhook_info.pending_update_count == 0:
-        text += "🟢 <b>Status: HEALTHY</b>"
+        status_line = "🟢 <b>Status: HEALTHY</b>"
     elif not webhook_info.url:
-        text += "🔴 <b>Status: NO WEBHOOK</b>"
+        status_line = "🔴 <b>Status: NO WEBHOOK</b>"
     elif webhook_info.pending_update_count > 0:
-        text += f"🟡 <b>Status: {webhook_info.pending_update_count} pending updates</b>"
+        status_line = f"🟡 <b>Status: {webhook_info.pending_update_count} pending updates</b>"
+    else:
+        status_line = ""
+    
+    text = _DIAG_TEMPLATE.format_map({
+        "bot_mode": bot_mode,
+        "storage_mode": storage_mode,
+        "instance_id": instance_id,
+        "lock_status": lock_status,
+        "last_start_time": last_start_time,
+        "url": webhook_info.url or "NOT SET",
+        "pending": webhook_info.pending_update_count,
+        "max_connections": webhook_info.max_connections or "default",
+        "ip_address": webhook_info.ip_address or "N/A",
+        "custom_cert": "✅" if webhook_info.has_custom_certificate else "❌",
+        "error_block": error_block,
+        "status_line": status_line,
+    })
     
     await message.answer(text, parse_mode="HTML")
@@ -2368,7 +2368,7 @@ async def fallback_callback(callback: CallbackQuery) -> None:
     from app.ui import tone_ru
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     
-    await callback.answer(tone_ru.MSG_BUTTON_OUTDATED.replace("<b>", "").replace("</b>", "").replace("\n\n", " "))
+    await callback.answer(tone_ru.MSG_BUTTON_OUTDATED_PLAIN)
     
     try:
         await callback.message.edit_text(
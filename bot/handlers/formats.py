@@ -1,16 +1,36 @@
 """Format-based navigation handlers."""
 import logging
+import time
+from typing import Any, Dict, List, Tuple
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 
-from app.ui.formats import FORMATS, get_model_format, group_models_by_format, get_popular_models, get_recommended_models
+from app.ui.formats import FORMATS, get_model_format, group_models_by_format, scan_models_for_format
 from app.ui.render import render_format_page, render_model_card
 from app.kie.builder import load_source_of_truth
 
 logger = logging.getLogger(__name__)
 router = Router(name="formats")
 
+# format_key -> (built_at, format_models, recommended, popular); treat as read-only
+_PAGE_CACHE_TTL_SECONDS = 30.0
+_PAGE_CACHE: Dict[str, Tuple[float, List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+
+
+def _format_page_models(format_key: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Format page models (cached per format for _PAGE_CACHE_TTL_SECONDS)."""
+    now = time.monotonic()
+    cached = _PAGE_CACHE.get(format_key)
+    if cached is not None and now - cached[0] < _PAGE_CACHE_TTL_SECONDS:
+        return cached[1:]
+    
+    models = load_source_of_truth().get("models", {})
+    result = scan_models_for_format(models, format_key, recommended_limit=3, popular_limit=8)
+    _PAGE_CACHE[format_key] = (now, *result)
+    return result
+
 
 @router.callback_query(F.data == "menu:formats")
 async def show_formats_menu(callback: CallbackQuery, state: FSMContext) -> None:
@@ -75,28 +95,12 @@ async def show_format_page(callback: CallbackQuery, state: FSMContext) -> None:
     
     format_obj = FORMATS[format_key]
     
-    # Load models
-    sot_data = load_source_of_truth()
-    models = sot_data.get("models", {})
-    
-    # Filter models by format
-    format_models = []
-    for model_id, model_config in models.items():
-        if not model_config.get("enabled", True):
-            continue
-        
-        model_format = get_model_format(model_config)
-        if model_format and model_format.key == format_key:
-            format_models.append(model_config)
+    format_models, recommended, popular = _format_page_models(format_key)
     
     if not format_models:
         await callback.answer("❌ Нет доступных моделей", show_alert=True)
         return
     
-    # Get recommended and popular
-    recommended = get_recommended_models(models, format_key, limit=3)
-    popular = get_popular_models(models, limit=8, format_key=format_key)
-    
     # Render text
     text = render_format_page(
         format_name=format_obj.name,
@@ -3,7 +3,15 @@ Marketing-focused bot handlers - НОВЫЙ UX СЛОЙ v1.
 
 Полностью переработанный UX под маркетологов/SMM.
 """
+import asyncio
+import inspect
+import json
 import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
@@ -17,8 +25,29 @@ from app.ui.catalog import (
     search_models,
     UI_CATEGORIES,
     get_all_enabled_models,
+    load_models_sot,
 )
+from app.admin.permissions import is_admin
+from app.database.users import ensure_user_exists
+from app.payments.charges import get_charge_manager
+from app.payments.integration import generate_with_payment
+from app.pricing.free_models import get_free_models
+try:
+    from app.referral.service import apply_referral_from_start
+except ImportError:  # referral service needs app.utils.logger, absent in some builds
+    apply_referral_from_start = None
+from app.ui import tone_ru
+from app.ui.format_groups import FORMAT_GROUPS, get_popular_models, group_by_format
 from app.ui.model_profile import build_profile
+from app.ui.style import StyleGuide
+from app.utils.config import get_config
+from app.utils.version import (
+    get_admin_version_info,
+    get_build_date,
+    get_git_commit,
+    get_version_string,
+)
+from bot.utils.bot_info import get_bot_username, get_referral_link
 from app.ui.nav import (
     build_back_row,
     add_navigation,
@@ -37,28 +66,36 @@ class SearchState(StatesGroup):
     waiting_for_query = State()
 
 
+# FREE models list shown on menus; rebuilt at most once per TTL (treat as read-only)
+_FREE_CACHE_TTL_SECONDS = 60.0
+_FREE_CACHE: Tuple[float, List[Dict[str, Any]]] = (0.0, [])
+
+
 def _get_free_models() -> list:
-    """Get list of free models."""
+    """Get list of free models (cached for _FREE_CACHE_TTL_SECONDS)."""
+    global _FREE_CACHE
+    cached_at, cached = _FREE_CACHE
+    now = time.monotonic()
+    if cached_at and now - cached_at < _FREE_CACHE_TTL_SECONDS:
+        return cached
     try:
-        from app.pricing.free_models import get_free_models
         free_ids = get_free_models()
-        
-        from app.ui.catalog import load_models_sot
         models_dict = load_models_sot()
         
-        return [
+        free_models = [
             models_dict[mid] for mid in free_ids
             if mid in models_dict and models_dict[mid].get("enabled", True)
         ]
     except Exception as e:
         logger.error(f"Failed to load free models: {e}")
         return []
+    _FREE_CACHE = (now, free_models)
+    return free_models
 
 
 def _get_bot_username() -> str:
     """Get bot username - DEPRECATED, use bot.utils.bot_info.get_bot_username instead."""
     try:
-        from app.utils.config import get_config
         cfg = get_config()
         username = cfg.telegram_bot_username
         if username:
@@ -68,10 +105,22 @@ def _get_bot_username() -> str:
     return "bot"  # Fallback (will be replaced by async version)
 
 
+# Per-user referral stats (user_id -> (fetched_at, stats)), LRU-bounded. Repeat
+# opens of the referral screen within the TTL skip the DB round-trip.
+_REF_CACHE: OrderedDict[int, Tuple[float, Dict[str, Any]]] = OrderedDict()
+_REF_CACHE_TTL_SECONDS = 30.0
+_REF_CACHE_MAX = 10_000
+
+
 async def _get_referral_stats(user_id: int) -> dict:
-    """Get referral stats."""
+    """Get referral stats (cached per user for _REF_CACHE_TTL_SECONDS)."""
+    now = time.monotonic()
+    entry = _REF_CACHE.get(user_id)
+    if entry is not None and now - entry[0] < _REF_CACHE_TTL_SECONDS:
+        _REF_CACHE.move_to_end(user_id)
+        return dict(entry[1])
+    
     try:
-        from app.payments.charges import get_charge_manager
         cm = get_charge_manager()
         
         if not cm or not hasattr(cm, "db_service"):
@@ -84,11 +133,16 @@ async def _get_referral_stats(user_id: int) -> dict:
             )
             
             if row:
-                return {
+                stats = {
                     "invites": row["referral_invites"] or 0,
                     "free_uses": row["referral_free_uses"] or 0,
                     "max_rub": row["referral_max_rub"] or 0,
                 }
+                _REF_CACHE[user_id] = (now, stats)
+                _REF_CACHE.move_to_end(user_id)
+                if len(_REF_CACHE) > _REF_CACHE_MAX:
+                    _REF_CACHE.popitem(last=False)
+                return dict(stats)
     except Exception as e:
         logger.debug(f"Referral stats error: {e}")
     
@@ -99,11 +153,18 @@ async def _get_referral_stats(user_id: int) -> dict:
 # ГЛАВНОЕ МЕНЮ (НОВАЯ СТРУКТУРА - Format-First UX)
 # ============================================================================
 
+# Main menu keyboard is the same for every user; its only variable part is the
+# FREE count, so one (free_count, keyboard) slot is enough (treat as read-only).
+_MAIN_MENU_CACHE: Tuple[int, Optional[InlineKeyboardMarkup]] = (-1, None)
+
+
 def _build_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Build main menu - format-first UX (syntx-level)."""
-    from app.ui import tone_ru
-    
+    global _MAIN_MENU_CACHE
     free_count = len(_get_free_models())
+    cached_count, cached_kb = _MAIN_MENU_CACHE
+    if cached_kb is not None and cached_count == free_count:
+        return cached_kb
     
     buttons = [
         # Топ-ряд: Форматы / Популярные
@@ -128,7 +189,41 @@ def _build_main_menu_keyboard() -> InlineKeyboardMarkup:
         ],
     ]
     
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    kb = InlineKeyboardMarkup(inline_keyboard=buttons)
+    _MAIN_MENU_CACHE = (free_count, kb)
+    return kb
+
+
+async def _apply_welcome_bonus(user_id: int) -> None:
+    """Credit the configured start bonus once (never raises)."""
+    try:
+        cfg = get_config()
+        start_bonus = getattr(cfg, 'start_bonus_rub', 0.0)
+        
+        cm = get_charge_manager()
+        if cm and start_bonus > 0:
+            await cm.ensure_welcome_credit(user_id, start_bonus)
+    except Exception as e:
+        logger.debug(f"Welcome bonus: {e}")
+
+
+async def _apply_start_referral(user_id: int, start_text: str) -> None:
+    """Apply a referral from the /start payload (never raises)."""
+    if apply_referral_from_start is None:
+        return
+    try:
+        cm = get_charge_manager()
+        if cm and hasattr(cm, "db_service"):
+            result = await apply_referral_from_start(
+                db_service=cm.db_service,
+                new_user_id=user_id,
+                start_text=start_text
+            )
+            # Only an applied referral changes stats, and only the inviter's
+            if result.get("applied"):
+                _REF_CACHE.pop(result.get("referrer_id"), None)
+    except Exception as e:
+        logger.debug(f"Referral: {e}")
 
 
 @router.message(Command("start"))
@@ -145,10 +240,8 @@ async def start_marketing(message: Message, state: FSMContext) -> None:
     
     # CRITICAL: Ensure user exists before any generation/payment operations
     try:
-        from app.payments.charges import get_charge_manager
         cm = get_charge_manager()
         if cm and hasattr(cm, "db_service"):
-            from app.database.users import ensure_user_exists
             await ensure_user_exists(
                 db_service=cm.db_service,
                 user_id=user_id,
@@ -159,45 +252,20 @@ async def start_marketing(message: Message, state: FSMContext) -> None:
     except Exception as e:
         logger.warning(f"User upsert failed (non-critical): {e}")
     
-    # Welcome bonus
-    try:
-        from app.payments.charges import get_charge_manager
-        from app.utils.config import get_config
-        
-        cfg = get_config()
-        start_bonus = getattr(cfg, 'start_bonus_rub', 0.0)
-        
-        cm = get_charge_manager()
-        if cm and start_bonus > 0:
-            await cm.ensure_welcome_credit(user_id, start_bonus)
-    except Exception as e:
-        logger.debug(f"Welcome bonus: {e}")
-    
-    # Referral
-    try:
-        from app.referral.service import apply_referral_from_start
-        from app.payments.charges import get_charge_manager
-        
-        cm = get_charge_manager()
-        if cm and hasattr(cm, "db_service"):
-            await apply_referral_from_start(
-                db_service=cm.db_service,
-                new_user_id=user_id,
-                start_text=message.text or ""
-            )
-    except Exception as e:
-        logger.debug(f"Referral: {e}")
+    # Welcome bonus + referral only need the user row: run them concurrently
+    await asyncio.gather(
+        _apply_welcome_bonus(user_id),
+        _apply_start_referral(user_id, message.text or ""),
+    )
     
     # Stats
     counts = get_counts()
     total = sum(counts.values())
     free_count = len(_get_free_models())
     
-    from app.ui.style import StyleGuide
     style = StyleGuide()
     
     # Check if admin
-    from app.admin.permissions import is_admin
     is_admin_user = is_admin(user_id)
     
     # Onboarding for newcomers: clear 3-step process
@@ -217,7 +285,6 @@ async def start_marketing(message: Message, state: FSMContext) -> None:
     
     # Admin build info
     if is_admin_user:
-        from app.utils.version import get_admin_version_info
         version_info = get_admin_version_info()
         text += f"\n\n🔧 Build: {version_info}"
     
@@ -227,17 +294,11 @@ async def start_marketing(message: Message, state: FSMContext) -> None:
 @router.message(Command("version"))
 async def version_command(message: Message) -> None:
     """Show build version (admin only)."""
-    from app.admin.permissions import is_admin
-    
     if not is_admin(message.from_user.id):
         await message.answer("⛔ Команда доступна только администраторам")
         return
     
     # Get build info
-    from app.utils.version import get_version_string, get_git_commit, get_build_date
-    import inspect
-    from app.payments.integration import generate_with_payment
-    
     # Build signature check
     sig = inspect.signature(generate_with_payment)
     params = list(sig.parameters.keys())
@@ -316,7 +377,6 @@ async def referral_screen(callback: CallbackQuery) -> None:
     stats = await _get_referral_stats(user_id)
     
     # Get bot username properly
-    from bot.utils.bot_info import get_bot_username, get_referral_link
     try:
         username = await get_bot_username(callback.bot)
         ref_link = get_referral_link(username, user_id)
@@ -325,7 +385,6 @@ async def referral_screen(callback: CallbackQuery) -> None:
         ref_link = None
         username = None
     
-    from app.ui.style import StyleGuide
     style = StyleGuide()
     
     text = (
@@ -428,8 +487,6 @@ async def formats_menu(callback: CallbackQuery) -> None:
     """Formats catalog menu (syntx-level UX)."""
     await callback.answer()
     
-    from app.ui.format_groups import FORMAT_GROUPS
-    
     text = (
         f"🧩 <b>Форматы</b>\n\n"
         f"Выберите тип задачи:"
@@ -438,7 +495,7 @@ async def formats_menu(callback: CallbackQuery) -> None:
     buttons = []
     for group_key, group_info in FORMAT_GROUPS.items():
         buttons.append([InlineKeyboardButton(
-            text=f"{group_info['emoji']} {group_info['title']}",
+            text=f"{group_info.emoji} {group_info.title}",
             callback_data=f"format_group:{group_key}"
         )])
     
@@ -454,9 +511,6 @@ async def format_group_screen(callback: CallbackQuery) -> None:
     
     group_key = callback.data.split(":", 1)[1]
     
-    from app.ui.format_groups import FORMAT_GROUPS, group_by_format
-    from app.ui.catalog import load_models_sot
-    
     if group_key not in FORMAT_GROUPS:
         await callback.message.edit_text("❌ Формат не найден", parse_mode="HTML")
         return
@@ -467,14 +521,14 @@ async def format_group_screen(callback: CallbackQuery) -> None:
     models_in_group = grouped.get(group_key, [])
     
     if not models_in_group:
-        text = f"{group_info['emoji']} <b>{group_info['title']}</b>\n\n❌ Модели пока не добавлены"
+        text = f"{group_info.emoji} <b>{group_info.title}</b>\n\n❌ Модели пока не добавлены"
         buttons = [build_back_row("menu:formats")]
         await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="HTML")
         return
     
     text = (
-        f"{group_info['emoji']} <b>{group_info['title']}</b>\n"
-        f"{group_info['desc']}\n\n"
+        f"{group_info.emoji} <b>{group_info.title}</b>\n"
+        f"{group_info.desc}\n\n"
         f"📦 Доступно моделей: {len(models_in_group)}"
     )
     
@@ -499,9 +553,6 @@ async def format_catalog_screen(callback: CallbackQuery) -> None:
     format_key = callback.data.split(":", 1)[1]
     
     # Load format map
-    import json
-    from pathlib import Path
-    
     # Use relative path from repo root
     repo_root = Path(__file__).resolve().parent.parent.parent
     map_file = repo_root / "app/ui/content/model_format_map.json"
@@ -564,8 +615,6 @@ async def format_catalog_screen(callback: CallbackQuery) -> None:
 
 async def show_model_card(callback: CallbackQuery, model_id: str) -> None:
     """Show Model Card screen before wizard."""
-    from app.ui import tone_ru
-    
     try:
         model = get_model(model_id)
         if not model:
@@ -575,9 +624,6 @@ async def show_model_card(callback: CallbackQuery, model_id: str) -> None:
         profile = build_profile(model)
         
         # Load format info
-        import json
-        from pathlib import Path
-        
         repo_root = Path(__file__).resolve().parent.parent.parent
         map_file = repo_root / "app/ui/content/model_format_map.json"
         format_str = "—"
@@ -623,7 +669,7 @@ async def show_model_card(callback: CallbackQuery, model_id: str) -> None:
             popularity = tone_ru.POPULARITY_LOW
         
         # Build card
-        text = tone_ru.MSG_MODEL_CARD_TEMPLATE.format(
+        text = tone_ru.render_model_card(
             display_name=profile["display_name"],
             description=profile["description"] or "AI-модель для креативных задач",
             format=format_str,
@@ -658,9 +704,6 @@ async def popular_screen(callback: CallbackQuery) -> None:
     """Popular models by popular_score."""
     await callback.answer()
     
-    from app.ui.format_groups import get_popular_models
-    from app.ui.catalog import load_models_sot
-    
     models_dict = load_models_sot()
     popular = get_popular_models(models_dict, limit=12)
     
@@ -757,7 +800,6 @@ async def search_start(callback: CallbackQuery, state: FSMContext) -> None:
     """Start search flow."""
     await callback.answer()
     
-    from app.ui.style import StyleGuide
     style = StyleGuide()
     
     text = (
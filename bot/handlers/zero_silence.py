@@ -12,14 +12,14 @@ logger = logging.getLogger(__name__)
 router = Router(name="zero_silence")
 
 
-def _fallback_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="🚀 Генерация", callback_data="menu:generate")],
-            [InlineKeyboardButton(text="💳 Баланс / Оплата", callback_data="menu:balance")],
-            [InlineKeyboardButton(text="ℹ️ Поддержка", callback_data="menu:support")],
-        ]
-    )
+# Static keyboard: built once at import, not per fallback reply
+_FALLBACK_MENU = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text="🚀 Генерация", callback_data="menu:generate")],
+        [InlineKeyboardButton(text="💳 Баланс / Оплата", callback_data="menu:balance")],
+        [InlineKeyboardButton(text="ℹ️ Поддержка", callback_data="menu:support")],
+    ]
+)
 
 
 @router.message(StateFilter(None), F.content_type.in_(["photo", "video", "audio", "document", "voice", "video_note"]))
@@ -30,7 +30,7 @@ async def handle_non_text_messages(message: Message):
     await message.answer(
         "📎 Файл получен, но сейчас я жду команды.\n\n"
         "Нажмите /start или выберите действие из меню.",
-        reply_markup=_fallback_menu(),
+        reply_markup=_FALLBACK_MENU,
     )
 
 
@@ -45,7 +45,7 @@ async def handle_text_messages(message: Message):
     await message.answer(
         "Я готов начать работу.\n\n"
         "Нажмите /start или выберите действие из меню.",
-        reply_markup=_fallback_menu(),
+        reply_markup=_FALLBACK_MENU,
     )
 
 
@@ -72,5 +72,5 @@ async def handle_text_unmatched_state(message: Message, state: FSMContext):
     logger.warning("E_INPUT unmatched text in state=%s uid=%s len=%s", st, getattr(message.from_user, "id", None), len(text))
     await message.answer(
         "Я вижу сообщение, но сейчас ожидается другой шаг.\n\nНажмите /start чтобы вернуться в меню, или выберите действие кнопками ниже.",
-        reply_markup=_fallback_menu(),
+        reply_markup=_FALLBACK_MENU,
     )
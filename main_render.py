@@ -23,7 +23,7 @@ log_version_info()
 # Project imports (explicit; no silent fallbacks)
 from app.utils.config import get_config, validate_env
 from app.utils.healthcheck import set_health_state
-from app.webhook_server import start_webhook_server, stop_webhook_server
+from app.webhook_server import create_bot_session, start_webhook_server, stop_webhook_server
 from app.utils.startup_validation import StartupValidationError, validate_startup
 
 # Logging configuration (production-grade format with request_id support)
@@ -173,6 +173,7 @@ def create_bot_application() -> Tuple[Dispatcher, Bot]:
     # Create bot with explicit configuration
     bot = Bot(
         token=bot_token,
+        session=create_bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
@@ -283,6 +284,13 @@ async def main():
     models_dict = load_models_sot()
     init_registry_from_models(models_dict)
     logger.info(f"Callback registry initialized with {len(models_dict)} models")
+
+    # Warm catalog indexes (category counts, popularity/format groups) so the
+    # first /start does not pay for building them
+    from app.ui.catalog import get_counts
+    from app.ui.format_groups import group_by_format
+    get_counts()
+    group_by_format(models_dict)
     
     # Validate environment
     config = get_config()
@@ -475,6 +483,7 @@ async def main():
                         bot=bot,
                         host="0.0.0.0",
                         port=port,
+                        db_service=db_service,
                     )
                     logger.info(f"✅ Webhook server started on 0.0.0.0:{port}")
                     logger.info(f"✅ Webhook registered successfully: {webhook_info.get('webhook_url')}")
@@ -6,7 +6,6 @@ from app.ui.callback_registry import (
     validate_callback_length,
     init_registry_from_models,
     _registry,
-    _reverse,
 )
 
 
@@ -90,7 +89,6 @@ def test_init_registry_from_models():
     
     # Clear registry
     _registry.clear()
-    _reverse.clear()
     
     # Initialize from models
     init_registry_from_models(mock_models)
@@ -151,3 +149,11 @@ def test_callback_key_length_real_world():
         for callback in callbacks:
             byte_length = len(callback.encode('utf-8'))
             assert byte_length <= 64, f"Callback exceeds limit: {callback} ({byte_length} bytes)"
+
+
+def test_validate_callback_length_counts_utf8_bytes():
+    """Non-ASCII callbacks are measured in UTF-8 bytes, not characters."""
+    validate_callback_length("я" * 32)  # 64 bytes
+    
+    with pytest.raises(ValueError, match="exceeds 64 bytes"):
+        validate_callback_length("я" * 33)  # 33 chars, 66 bytes
@@ -1,6 +1,12 @@
 """Test format-first navigation and premium UX."""
 import pytest
-from app.ui.formats import FORMATS, get_popular_models, get_recommended_models, get_model_format
+from app.ui.formats import (
+    FORMATS,
+    get_model_format,
+    get_popular_models,
+    get_recommended_models,
+    scan_models_for_format,
+)
 
 
 def test_formats_defined():
@@ -52,6 +58,21 @@ def test_recommended_models_per_format():
         assert len(recommended) <= 3
 
 
+def test_scan_models_for_format_matches_separate_calls():
+    """Fused format scan returns the same picks as the individual helpers."""
+    from app.ui.catalog import load_models_sot
+    
+    models_dict = load_models_sot()
+    
+    for format_key in FORMATS.keys():
+        format_models, recommended, popular = scan_models_for_format(
+            models_dict, format_key, recommended_limit=3, popular_limit=8
+        )
+        assert recommended == get_recommended_models(models_dict, format_key, limit=3)
+        assert popular == get_popular_models(models_dict, limit=8, format_key=format_key)
+        assert all(get_model_format(m).key == format_key for m in format_models)
+
+
 def test_model_format_detection():
     """Models should be correctly categorized into formats."""
     from app.ui.catalog import load_models_sot
@@ -0,0 +1,94 @@
+"""Tests for app.ui.format_groups grouping and popularity ordering."""
+from app.ui.format_groups import (
+    FORMAT_GROUPS,
+    get_format_group,
+    get_popular_models,
+    get_popular_score,
+    group_by_format,
+)
+
+
+def _catalog():
+    return {
+        "cheap-t2i": {"model_id": "cheap-t2i", "category": "text-to-image", "pricing": {"rub_per_gen": 5}},
+        "mid-t2i": {"model_id": "mid-t2i", "category": "text-to-image", "pricing": {"rub_per_gen": 20}},
+        "tie-t2i": {"model_id": "tie-t2i", "category": "text-to-image", "pricing": {"rub_per_gen": 30}},
+        "pinned": {"model_id": "pinned", "category": "image-to-video", "ui": {"popular_score": 99}},
+        "off": {"model_id": "off", "category": "text-to-image", "enabled": False},
+        "odd": {"model_id": "odd", "category": "x", "ui": {"format_group": "unknown-group"}},
+    }
+
+
+def _reference_order(models):
+    enabled = [m for m in models.values() if m.get("enabled", True)]
+    return sorted(enabled, key=get_popular_score, reverse=True)
+
+
+def test_group_by_format_buckets_and_order():
+    grouped = group_by_format(_catalog())
+
+    assert set(grouped) == set(FORMAT_GROUPS)
+    assert [m["model_id"] for m in grouped["text2image"]] == ["cheap-t2i", "mid-t2i", "tie-t2i"]
+    assert [m["model_id"] for m in grouped["image2video"]] == ["pinned"]
+    assert [m["model_id"] for m in grouped["tools"]] == ["odd"]
+
+
+def test_get_popular_models_matches_stable_sort():
+    models = _catalog()
+    expected = _reference_order(models)
+
+    for limit in (0, 1, 3, 10):
+        assert get_popular_models(models, limit=limit) == expected[:limit]
+
+
+def test_get_format_group_inference():
+    assert get_format_group({"category": "Text-To-Video"}) == "text2video"
+    assert get_format_group({"category": "tts"}) == "text2audio"
+    assert get_format_group({"category": "speech transcription"}) == "audio2text"
+    assert get_format_group({"category": "i2i"}) == "image2image"
+    assert get_format_group({"category": "upscale"}) == "tools"
+    assert get_format_group({}) == "tools"
+
+
+def test_popularity_index_reused_until_catalog_changes(monkeypatch):
+    from app.ui import format_groups
+
+    calls = []
+    real_score = format_groups.get_popular_score
+    monkeypatch.setattr(format_groups, "get_popular_score", lambda m: calls.append(1) or real_score(m))
+    format_groups.invalidate_popularity_cache()
+
+    models = _catalog()
+    enabled = sum(1 for m in models.values() if m.get("enabled", True))
+    get_popular_models(models, limit=2)
+    group_by_format(models)
+    assert len(calls) == enabled
+
+    # Cached grouping hands out independent lists
+    group_by_format(models)["text2image"].clear()
+    assert len(group_by_format(models)["text2image"]) == 3
+
+    get_popular_models(_catalog(), limit=2)
+    assert len(calls) == 2 * enabled
+
+    format_groups.invalidate_popularity_cache()
+
+
+def test_get_popular_score_price_ladder_boundaries():
+    def score(rub):
+        return get_popular_score({"pricing": {"rub_per_gen": rub}})
+
+    assert [score(x) for x in (0, 9.99, 10, 49, 50, 199, 200, 10_000)] == [90, 90, 70, 70, 50, 50, 30, 30]
+    assert get_popular_score({}) == 30
+    assert get_popular_score({"ui": {"popular_score": 0}, "pricing": {"rub_per_gen": 1}}) == 0
+
+
+def test_sot_reload_hook_drops_popularity_index():
+    from app.ui import format_groups
+    from app.ui.catalog import reload_models_sot
+
+    get_popular_models(_catalog(), limit=2)
+    assert format_groups._POP_CACHE["ranked"] is not None
+
+    reload_models_sot()
+    assert format_groups._POP_CACHE["ranked"] is None
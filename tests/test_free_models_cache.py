@@ -0,0 +1,103 @@
+"""
+Tests for app.pricing.free_models SOURCE_OF_TRUTH caching.
+"""
+import json
+import os
+
+import pytest
+
+from app.pricing import free_models
+
+
+@pytest.fixture
+def sot_file(tmp_path, monkeypatch):
+    path = tmp_path / "sot.json"
+    path.write_text(json.dumps({
+        "models": {
+            "a": {"model_id": "a", "pricing": {"rub_per_use": 1.5, "is_free": True}},
+            "b": {"model_id": "b", "pricing": {"rub_per_gen": 9.0}},
+        }
+    }), encoding="utf-8")
+    monkeypatch.setattr(free_models, "SOURCE_OF_TRUTH", path)
+    monkeypatch.setattr(free_models, "_cache", {
+        "key": None, "models": None, "free_ids": None, "free_set": None, "price_by_id": {},
+    })
+    return path
+
+
+def test_models_parsed_once_until_file_changes(sot_file, monkeypatch):
+    loads = []
+    real_load = json.load
+    monkeypatch.setattr(free_models, "orjson", None)
+    monkeypatch.setattr(free_models.json, "load", lambda f: loads.append(1) or real_load(f))
+
+    assert free_models.get_model_price("b")["rub_per_use"] == 9.0
+    assert free_models.get_model_price("b")["rub_per_use"] == 9.0
+    free_models.get_all_models_by_category()
+    assert len(loads) == 1
+
+    data = json.loads(sot_file.read_text(encoding="utf-8"))
+    data["models"]["b"]["pricing"]["rub_per_gen"] = 12.0
+    sot_file.write_text(json.dumps(data), encoding="utf-8")
+    stat = sot_file.stat()
+    os.utime(sot_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert free_models.get_model_price("b")["rub_per_use"] == 12.0
+    assert len(loads) == 2
+
+
+def test_orjson_and_stdlib_parse_identically(sot_file, monkeypatch):
+    pytest.importorskip("orjson")
+    with_orjson = free_models._load_models()
+
+    monkeypatch.setattr(free_models, "orjson", None)
+    monkeypatch.setitem(free_models._cache, "models", None)
+    assert free_models._load_models() == with_orjson
+
+
+def test_cached_price_is_not_shared(sot_file):
+    price = free_models.get_model_price("b")
+    price["rub_per_use"] = 0.0
+    assert free_models.get_model_price("b")["rub_per_use"] == 9.0
+
+
+def test_is_free_model_uses_cached_set(sot_file, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        free_models, "_resolve_free_models", lambda: calls.append(1) or (["a"], True)
+    )
+
+    assert free_models.is_free_model("a") is True
+    assert free_models.is_free_model("b") is False
+    assert len(calls) == 1
+
+    free_models.invalidate_free_cache()
+    assert free_models.is_free_model("a") is True
+    assert len(calls) == 2
+
+    # A new SOURCE_OF_TRUTH version drops the set too
+    stat = sot_file.stat()
+    os.utime(sot_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert free_models.is_free_model("a") is True
+    assert len(calls) == 3
+
+
+def test_free_set_not_cached_on_error(sot_file, monkeypatch):
+    results = [([], False), (["a"], True)]
+    monkeypatch.setattr(free_models, "_resolve_free_models", lambda: results.pop(0))
+
+    assert free_models.is_free_model("a") is False
+    assert free_models.is_free_model("a") is True
+    assert free_models.is_free_model("a") is True
+    assert results == []
+
+
+def test_sot_reload_hook_drops_free_set(sot_file, monkeypatch):
+    from app.ui.catalog import reload_models_sot
+
+    monkeypatch.setattr(free_models, "_resolve_free_models", lambda: (["a"], True))
+    free_models.is_free_model("a")
+    assert free_models._cache["free_set"] is not None
+
+    reload_models_sot()
+    assert free_models._cache["free_set"] is None
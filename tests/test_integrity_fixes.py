@@ -29,7 +29,47 @@ class TestDatabaseSafety:
         
         # Should not raise
         await ensure_user_exists(None, user_id=12345)
-    
+
+    @pytest.mark.asyncio
+    async def test_ensure_user_exists_skips_repeat_upserts(self):
+        """Verify unchanged repeat calls skip the DB and the UPDATE is gated."""
+        from app.database.users import ensure_user_exists, clear_ensured_users_cache
+
+        clear_ensured_users_cache()
+        db = MagicMock()
+        db.execute = AsyncMock()
+
+        await ensure_user_exists(db, user_id=777, username="u", first_name="F")
+        await ensure_user_exists(db, user_id=777, username="u", first_name="F")
+        assert db.execute.call_count == 1
+        assert "IS DISTINCT FROM" in db.execute.call_args[0][0]
+
+        # Changed profile goes to DB again
+        await ensure_user_exists(db, user_id=777, username="renamed", first_name="F")
+        assert db.execute.call_count == 2
+        clear_ensured_users_cache()
+
+    @pytest.mark.asyncio
+    async def test_ensured_users_cache_is_per_service(self):
+        """Verify a new service upserts again and close() forgets the service's users."""
+        from app.database.users import ensure_user_exists, clear_ensured_users_cache
+        from app.database.services import DatabaseService
+        
+        clear_ensured_users_cache()
+        db = DatabaseService("postgresql://test")
+        db.execute = AsyncMock()
+        other = MagicMock()
+        other.execute = AsyncMock()
+        
+        await ensure_user_exists(db, user_id=778, username="u")
+        await ensure_user_exists(other, user_id=778, username="u")
+        assert other.execute.call_count == 1
+        
+        await db.close()
+        await ensure_user_exists(db, user_id=778, username="u")
+        assert db.execute.call_count == 2
+        clear_ensured_users_cache()
+
     @pytest.mark.asyncio
     async def test_log_generation_never_raises(self):
         """Verify generation event logging never crashes generation."""
@@ -90,7 +130,38 @@ class TestIdempotency:
         started, existing = idem_try_start(key)
         assert started is False
         assert existing.status == 'success'
-    
+
+    def test_idem_expired_key_can_restart(self):
+        """Verify expired keys are treated as absent on access and can be restarted."""
+        from app.utils import idempotency
+
+        key = "test_key_expiry"
+        with patch.object(idempotency.time, 'monotonic', return_value=1000.0):
+            assert idempotency.idem_try_start(key, ttl_s=10)[0] is True
+        with patch.object(idempotency.time, 'monotonic', return_value=1011.0):
+            assert idempotency.idem_try_start(key, ttl_s=60)[0] is True
+        # Expired entry (1010) was replaced; new entry (1071) still live
+        with patch.object(idempotency.time, 'monotonic', return_value=1050.0):
+            started, existing = idempotency.idem_try_start(key, ttl_s=60)
+        assert started is False
+        assert existing.expires_at == 1071.0
+
+    def test_idem_store_is_bounded(self):
+        """Verify each shard evicts its least recently used key at the cap."""
+        from app.utils import idempotency
+
+        idempotency.clear_all_keys()
+        with patch.object(idempotency, '_SHARD_MAX', 3), \
+                patch.object(idempotency, '_shard', return_value=idempotency._SHARDS[0]):
+            for key in ("a", "b", "c"):
+                idempotency.idem_try_start(key)
+            idempotency.idem_get("a")  # touch: "b" becomes the oldest
+            idempotency.idem_try_start("d")
+            assert idempotency.idem_get("b") is None
+            assert idempotency.idem_get("a") is not None
+            assert len(idempotency._SHARDS[0].store) == 3
+        idempotency.clear_all_keys()
+
     def test_build_generation_key_stable(self):
         """Verify generation key is stable for same inputs."""
         from app.utils.idempotency import build_generation_key
@@ -198,6 +269,119 @@ class TestPaymentIntegrity:
                 assert result['success'] is True
                 assert result['payment_status'] == 'free_tier'
 
+    @staticmethod
+    def _referral_patches(user_service, generate):
+        """Patch a paid model run with a mocked UserService and generator."""
+        from contextlib import ExitStack
+        
+        stack = ExitStack()
+        stack.enter_context(patch('app.payments.integration.is_free_model', return_value=False))
+        stack.enter_context(patch('app.payments.integration.UserService', return_value=user_service))
+        stack.enter_context(patch('app.payments.integration.log_generation_event', new=AsyncMock()))
+        stack.enter_context(patch('app.payments.integration.track_generation', new=AsyncMock()))
+        gen = stack.enter_context(patch('app.payments.integration.KieGenerator'))
+        gen.return_value.generate = generate
+        return stack
+    
+    @staticmethod
+    def _charge_manager():
+        cm = MagicMock()
+        cm.db_service = MagicMock()
+        cm.create_pending_charge = AsyncMock(return_value={'status': 'pending', 'message': 'ok'})
+        cm.commit_charge = AsyncMock(return_value={'status': 'committed', 'message': 'ok'})
+        cm.release_charge = AsyncMock(return_value={'status': 'released', 'message': 'ok'})
+        return cm
+    
+    @pytest.mark.asyncio
+    async def test_referral_free_use_is_consumed(self):
+        """Verify a paid model within the cap uses a referral-free generation."""
+        from app.payments.integration import generate_with_payment
+        
+        user_service = MagicMock()
+        user_service.consume_metadata_counter = AsyncMock(return_value=2)
+        user_service.increment_metadata_counter = AsyncMock()
+        cm = self._charge_manager()
+        generate = AsyncMock(return_value={'success': True, 'result_urls': ['http://x/r.jpg']})
+        
+        with self._referral_patches(user_service, generate):
+            result = await generate_with_payment(
+                model_id='paid', user_inputs={'prompt': 'p'}, user_id=1, amount=10.0, charge_manager=cm
+            )
+        
+        assert result['payment_status'] == 'referral_free'
+        user_service.consume_metadata_counter.assert_awaited_once_with(1, 'referral_free_uses')
+        user_service.increment_metadata_counter.assert_not_awaited()
+        cm.create_pending_charge.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_no_referral_uses_falls_through_to_charging(self):
+        """Verify a missing or zero counter (consume returns None) charges normally."""
+        from app.payments.integration import generate_with_payment
+        
+        user_service = MagicMock()
+        user_service.consume_metadata_counter = AsyncMock(return_value=None)
+        cm = self._charge_manager()
+        generate = AsyncMock(return_value={'success': True, 'result_urls': []})
+        
+        with self._referral_patches(user_service, generate):
+            result = await generate_with_payment(
+                model_id='paid', user_inputs={'prompt': 'p'}, user_id=1, amount=10.0, charge_manager=cm
+            )
+        
+        assert result['payment_status'] == 'committed'
+        cm.create_pending_charge.assert_awaited_once()
+        cm.commit_charge.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_failed_referral_generation_restores_use(self):
+        """Verify a failed referral-free generation gives the use back."""
+        from app.payments.integration import generate_with_payment
+        
+        user_service = MagicMock()
+        user_service.consume_metadata_counter = AsyncMock(return_value=0)
+        user_service.increment_metadata_counter = AsyncMock(return_value=1)
+        cm = self._charge_manager()
+        generate = AsyncMock(return_value={'success': False, 'message': 'boom'})
+        
+        with self._referral_patches(user_service, generate):
+            result = await generate_with_payment(
+                model_id='paid', user_inputs={'prompt': 'p'}, user_id=1, amount=10.0, charge_manager=cm
+            )
+        
+        assert result['payment_status'] == 'referral_free_failed'
+        user_service.increment_metadata_counter.assert_awaited_once_with(1, 'referral_free_uses', +1)
+    
+    @pytest.mark.asyncio
+    async def test_referral_generation_exception_restores_use(self):
+        """Verify a generator exception does not consume the free use permanently."""
+        from app.payments.integration import generate_with_payment
+        
+        user_service = MagicMock()
+        user_service.consume_metadata_counter = AsyncMock(return_value=0)
+        user_service.increment_metadata_counter = AsyncMock(return_value=1)
+        cm = self._charge_manager()
+        generate = AsyncMock(side_effect=RuntimeError("upstream down"))
+        
+        with self._referral_patches(user_service, generate):
+            with pytest.raises(RuntimeError):
+                await generate_with_payment(
+                    model_id='paid', user_inputs={'prompt': 'p'}, user_id=1, amount=10.0, charge_manager=cm
+                )
+        
+        user_service.increment_metadata_counter.assert_awaited_once_with(1, 'referral_free_uses', +1)
+    
+    @pytest.mark.asyncio
+    async def test_metrics_failure_keeps_charge_result(self):
+        """Verify a track_generation error never replaces the commit/release result."""
+        from app.payments.integration import _settle_with_metrics
+        
+        commit = AsyncMock(return_value={'status': 'committed', 'message': 'ok'})
+        with patch('app.payments.integration.track_generation',
+                   new=AsyncMock(side_effect=RuntimeError("metrics down"))):
+            result = await _settle_with_metrics(commit(), {'model_id': 'flux'})
+        
+        assert result['status'] == 'committed'
+
 
 class TestJobLockSafety:
     """Test job lock is released in finally."""
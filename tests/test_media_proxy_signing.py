@@ -73,5 +73,35 @@ def test_public_base_url_configured():
     assert not base_url.endswith("/")
 
 
+@pytest.mark.asyncio
+async def test_concurrent_file_resolves_are_coalesced():
+    """Concurrent cache misses for one file_id should share one get_file call."""
+    import asyncio
+    from unittest.mock import MagicMock
+    from app import webhook_server
+
+    webhook_server._media_proxy_cache.clear()
+    calls = 0
+
+    async def get_file(file_id):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return MagicMock(file_path=f"photos/{file_id}.jpg")
+
+    bot = MagicMock()
+    bot.get_file = get_file
+
+    paths = await asyncio.gather(
+        *(webhook_server._resolve_file_path(bot, "same_file") for _ in range(5))
+    )
+
+    assert calls == 1
+    assert paths == ["photos/same_file.jpg"] * 5
+    assert webhook_server._media_proxy_cache["same_file"][0] == "photos/same_file.jpg"
+    assert not webhook_server._media_proxy_inflight
+    webhook_server._media_proxy_cache.clear()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
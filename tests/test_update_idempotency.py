@@ -123,3 +123,181 @@ def test_processed_updates_logic_import():
     assert callable(mark_update_processed)
     assert callable(is_update_processed)
     assert callable(cleanup_old_updates)
+
+
+class _FakeDedupeDB:
+    """Minimal stand-in for DatabaseService that emulates ON CONFLICT ... RETURNING."""
+    
+    def __init__(self, error: Exception = None):
+        self.rows = set()
+        self.calls = 0
+        self.error = error
+    
+    async def fetch(self, query, update_ids):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        inserted = [uid for uid in update_ids if uid not in self.rows]
+        self.rows.update(inserted)
+        return [{"update_id": uid} for uid in inserted]
+
+
+@pytest.fixture
+def clean_seen_cache():
+    from app.database import processed_updates
+    processed_updates._seen.clear()
+    yield processed_updates
+    processed_updates._seen.clear()
+
+
+@pytest.mark.asyncio
+async def test_mark_update_processed_single_round_trip(clean_seen_cache):
+    """Insert + duplicate detection must use exactly one query per call."""
+    from app.database.processed_updates import mark_update_processed
+    
+    db = _FakeDedupeDB()
+    assert await mark_update_processed(db, 42) is True
+    assert db.calls == 1
+    
+    # Another instance already inserted it: DB reports duplicate
+    db.rows.add(44)
+    assert await mark_update_processed(db, 44) is False
+    assert db.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_local_cache_short_circuits_db(clean_seen_cache):
+    """Repeats seen by this instance never reach Postgres."""
+    from app.database.processed_updates import mark_update_processed, is_update_processed
+    
+    db = _FakeDedupeDB()
+    assert await mark_update_processed(db, 45) is True
+    assert await mark_update_processed(db, 45) is False
+    assert await is_update_processed(db, 45) is True
+    assert db.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_marks_share_one_batch(clean_seen_cache):
+    """Concurrent updates are flushed with a single INSERT round-trip."""
+    import asyncio
+    from app.database.processed_updates import mark_update_processed
+    
+    db = _FakeDedupeDB()
+    db.rows.add(103)
+    results = await asyncio.gather(
+        *(mark_update_processed(db, uid) for uid in (100, 101, 102, 103, 100))
+    )
+    assert results == [True, True, True, False, False]
+    assert db.calls == 1
+
+
+def test_local_cache_is_bounded(clean_seen_cache, monkeypatch):
+    """Cache evicts oldest entries beyond _SEEN_MAX."""
+    monkeypatch.setattr(clean_seen_cache, "_SEEN_MAX", 3)
+    for update_id in range(5):
+        clean_seen_cache._remember(update_id)
+    assert list(clean_seen_cache._seen) == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_mark_update_processed_db_error_fails_open(clean_seen_cache):
+    """Connection-level errors must not drop updates."""
+    from app.database.processed_updates import mark_update_processed
+    
+    db = _FakeDedupeDB(error=OSError("connection reset"))
+    assert await mark_update_processed(db, 43) is True
+
+
+def _batcher_tasks():
+    import asyncio
+    return [
+        t for t in asyncio.all_tasks()
+        if getattr(t.get_coro(), "__qualname__", "") == "_UpdateBatcher._run"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batcher_task_stops_with_service(clean_seen_cache):
+    """Closing or collecting the service stops its worker task."""
+    import asyncio
+    import gc
+    from app.database.processed_updates import close_update_batcher, mark_update_processed
+    
+    closed = _FakeDedupeDB()
+    assert await mark_update_processed(closed, 48) is True
+    await close_update_batcher(closed)
+    
+    dropped = _FakeDedupeDB()
+    assert await mark_update_processed(dropped, 49) is True
+    del dropped
+    gc.collect()
+    await asyncio.sleep(0)
+    
+    assert _batcher_tasks() == []
+
+
+@pytest.mark.asyncio
+async def test_batcher_cancelled_mid_flush_fails_open(clean_seen_cache):
+    """Stopping the batcher during a query must not leave callers hanging."""
+    import asyncio
+    from app.database.processed_updates import close_update_batcher, mark_update_processed
+    
+    class _StuckDB(_FakeDedupeDB):
+        async def fetch(self, query, update_ids):
+            self.calls += 1
+            await asyncio.Event().wait()
+    
+    db = _StuckDB()
+    pending = asyncio.ensure_future(mark_update_processed(db, 50))
+    while db.calls == 0:
+        await asyncio.sleep(0.01)
+    
+    await close_update_batcher(db)
+    assert await asyncio.wait_for(pending, 1) is True
+@pytest.mark.asyncio
+async def test_mark_update_processed_without_pool_fails_open(clean_seen_cache):
+    """A service with no pool (not initialized / closed) must not fail the update."""
+    from app.database.processed_updates import mark_update_processed
+    
+    db = _FakeDedupeDB()
+    db.pool = None
+    assert await mark_update_processed(db, 47) is True
+    assert db.calls == 0
+
+@pytest.mark.asyncio
+async def test_cleanup_old_updates_parameterized_chunks(monkeypatch):
+    """Cleanup passes days as a bind parameter and loops until a short chunk."""
+    from app.database import processed_updates
+    
+    monkeypatch.setattr(processed_updates, "_CLEANUP_CHUNK", 2)
+    results = iter(["DELETE 2", "DELETE 2", "DELETE 1"])
+    calls = []
+    
+    class _DB:
+        async def execute(self, query, *args):
+            calls.append((query, args))
+            return next(results)
+    
+    deleted = await processed_updates.cleanup_old_updates(_DB(), days=7)
+    assert deleted == 5
+    assert len(calls) == 3
+    assert all(args == (7, 2) for _, args in calls)
+    assert "{" not in calls[0][0] and "7 days" not in calls[0][0]
+
+
+@pytest.mark.asyncio
+async def test_batcher_does_not_keep_db_service_alive(clean_seen_cache):
+    """The per-service batcher entry goes away with its service."""
+    import gc
+    import weakref
+    from app.database.processed_updates import _batchers, mark_update_processed
+    
+    db = _FakeDedupeDB()
+    assert await mark_update_processed(db, 46) is True
+    assert db in _batchers
+    
+    db_ref = weakref.ref(db)
+    del db
+    gc.collect()
+    assert db_ref() is None